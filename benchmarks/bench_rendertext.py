@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+''' Compares the GIF transparency patching of rendertext.render against
+    the former per pixel loop, over a range of string lengths, and checks
+    both produce byte-identical GIF files.
+
+        python benchmarks/bench_rendertext.py
+'''
+from __future__ import print_function
+
+import io
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from django.conf import settings
+if not settings.configured and 'DJANGO_SETTINGS_MODULE' not in os.environ:
+    settings.configure()
+
+from PIL import Image, ImageDraw, ImageFont
+
+from listings.templatetags.rendertext import to_transparent_gif
+
+LENGTHS = (8, 32, 128, 512, 2048)
+REPEAT = 5
+
+
+def legacy_to_transparent_gif(im):
+    oldim = im
+    im = im.convert('P', dither=Image.NONE)
+
+    hist = im.histogram()
+    min_val = 1000000
+    index = 0
+    for i in range(0, len(hist)):
+        if hist[i] < min_val:
+            min_val = hist[i]
+            index = i
+            if min_val == 0:
+                break
+
+    src = oldim.load()
+    dest = im.load()
+    for y in range(0, im.size[1]):
+        for x in range(0, im.size[0]):
+            if src[x, y][3] == 0:
+                dest[x, y] = index
+    return im, index
+
+
+def make_image(length):
+    text = ('someone.%d@example.com ' % length * length)[:length]
+    font = ImageFont.load_default()
+    if hasattr(font, 'getsize'):
+        size = font.getsize(text)
+    else:
+        size = ImageDraw.Draw(Image.new('RGBA', (1, 1))).textbbox((0, 0), text, font=font)[2:]
+    im = Image.new('RGBA', size, (255, 255, 255, 0))
+    ImageDraw.Draw(im).text((0, 0), text + ' ', font=font, fill=(0, 0, 0))
+    return im
+
+
+def as_gif(convert, im):
+    pim, index = convert(im)
+    output = io.BytesIO()
+    pim.save(output, 'GIF', transparency=index)
+    return output.getvalue()
+
+
+def main():
+    print('%8s %12s %12s %12s %8s %10s' % ('length', 'pixels', 'legacy ms', 'current ms', 'speedup', 'identical'))
+    for length in LENGTHS:
+        im = make_image(length)
+        legacy = min(timeit.repeat(lambda: legacy_to_transparent_gif(im), number=1, repeat=REPEAT))
+        current = min(timeit.repeat(lambda: to_transparent_gif(im), number=1, repeat=REPEAT))
+        identical = as_gif(legacy_to_transparent_gif, im) == as_gif(to_transparent_gif, im)
+        print('%8d %12d %12.2f %12.2f %7.1fx %10s' % (length, im.size[0] * im.size[1],
+                                                      legacy * 1000, current * 1000,
+                                                      legacy / current, identical))
+
+
+if __name__ == '__main__':
+    main()
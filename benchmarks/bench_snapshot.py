@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+''' Measures the memory a worker spends on the snapshot of the active jobs
+    (LISTINGS_SNAPSHOT), against keeping the same rows as values_list()
+    tuples or values() dicts, and how long building and querying it takes.
+
+    Every structure is built in a fresh interpreter from synthetic rows, and
+    the growth of the peak RSS of the process is reported:
+
+        python benchmarks/bench_snapshot.py [number of jobs]
+'''
+from __future__ import print_function
+
+import os
+import subprocess
+import sys
+
+STRUCTURES = ('snapshot', 'tuples', 'dicts')
+
+PROBE = '''
+import datetime, random, resource, sys, time
+sys.path.insert(0, %(root)r)
+from django.conf import settings
+if not settings.configured:
+    settings.configure()
+from listings.snapshot import Snapshot, FIELDS
+
+def rows(count):
+    rnd = random.Random(0)
+    start = datetime.datetime(2012, 1, 1)
+    companies = ['company-%%d' %% i for i in range(count // 20 + 1)]
+    for pk in range(1, count + 1):
+        company = rnd.choice(companies)
+        yield (pk, start + datetime.timedelta(seconds=rnd.randint(0, 10 ** 8)),
+               rnd.randint(1, 30), rnd.randint(1, 4), rnd.choice([None] + list(range(1, 2000))),
+               company, company.replace('-', ' ').title())
+
+before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+started = time.time()
+if %(structure)r == 'snapshot':
+    data = Snapshot.from_rows(0, rows(%(count)d))
+elif %(structure)r == 'tuples':
+    data = list(rows(%(count)d))
+else:
+    data = [dict(zip(FIELDS, row)) for row in rows(%(count)d)]
+built = time.time() - started
+grown = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - before
+
+query = '-'
+if %(structure)r == 'snapshot':
+    started = time.time()
+    for category_id in range(1, 31):
+        len(data.job_ids(category_id=category_id, jobtype_id=1))
+    query = '%%.2f' %% ((time.time() - started) * 1000 / 30)
+print('%%.0f %%d %%s' %% (built * 1000, grown, query))
+'''
+
+
+def probe(structure, count):
+    code = PROBE % {'root': os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'),
+                    'structure': structure, 'count': count}
+    output = subprocess.check_output([sys.executable, '-c', code])
+    built, grown, query = output.decode('utf-8').strip().splitlines()[-1].split(' ')
+    return float(built), int(grown), query
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    print('%d jobs' % count)
+    print('%-10s %10s %14s %16s' % ('structure', 'build ms', 'peak RSS kB', 'filter query ms'))
+    for structure in STRUCTURES:
+        built, grown, query = probe(structure, count)
+        print('%-10s %10.0f %14d %16s' % (structure, built, grown, query))
+
+
+if __name__ == '__main__':
+    main()
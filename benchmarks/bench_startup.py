@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+''' Measures how expensive it is to import the listings package.
+
+    Every module is imported in a fresh interpreter, and the script reports
+    the wall time of the import, the peak RSS of the process, whether a
+    database connection got opened and which heavy optional modules ended
+    up loaded. Run it with the project settings available:
+
+        DJANGO_SETTINGS_MODULE=mysite.settings python benchmarks/bench_startup.py
+'''
+from __future__ import print_function
+
+import os
+import subprocess
+import sys
+
+MODULES = (
+    'listings.models',
+    'listings.helpers',
+    'listings.postman',
+    'listings.views',
+    'listings.urls',
+    'listings.templatetags.listings_tags',
+    'listings.templatetags.obfuscate',
+    'listings.templatetags.rendertext',
+)
+
+HEAVY_MODULES = ('bs4', 'PIL', 'textile', 'markdown', 'html5lib')
+
+PROBE = '''
+import resource, sys, time
+start = time.time()
+import %(module)s
+elapsed = time.time() - start
+from django.db import connection
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+heavy = [m for m in %(heavy)r if m in sys.modules]
+print('%%.1f %%d %%s %%s' %% (elapsed * 1000, rss, connection.connection is not None, ','.join(heavy) or '-'))
+'''
+
+
+def probe(module):
+    code = PROBE % {'module': module, 'heavy': HEAVY_MODULES}
+    output = subprocess.check_output([sys.executable, '-c', code], env=os.environ)
+    elapsed, rss, db, heavy = output.decode('utf-8').strip().splitlines()[-1].split(' ')
+    return float(elapsed), int(rss), db == 'True', heavy
+
+
+def main():
+    if 'DJANGO_SETTINGS_MODULE' not in os.environ:
+        sys.exit('DJANGO_SETTINGS_MODULE must be set.')
+    print('%-40s %10s %12s %5s  %s' % ('module', 'import ms', 'peak RSS kB', 'db', 'heavy modules'))
+    for module in MODULES:
+        elapsed, rss, db, heavy = probe(module)
+        print('%-40s %10.1f %12d %5s  %s' % (module, elapsed, rss, db and 'yes' or 'no', heavy))
+
+
+if __name__ == '__main__':
+    main()
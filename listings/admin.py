@@ -1,19 +1,24 @@
 # -*- coding: utf-8 -*-
 
-from listings.models import Type, Job, JobStat, JobSearch, POSTING_ACTIVE, POSTING_INACTIVE
+from listings.models import Type, Job, JobStat, JobSearch, ArchivedJob, DuplicateJob, BlockedIP, POSTING_ACTIVE, POSTING_INACTIVE, update_jobs, \
+    build_blocklist
 from listings.syndication.models import Feed
+from listings.exports import EXPORTS, export_response
+from listings.conf import settings as listings_settings
 
 from django.contrib import admin
+from django.db import connections
+from django.db.models.query import QuerySet
 from django.utils.translation import ugettext_lazy as _
 
 
 def activate_ads(modeladmin, request, queryset):
-    queryset.update(status=POSTING_ACTIVE)
+    update_jobs(queryset, status=POSTING_ACTIVE)
 activate_ads.short_description = _('Activate selected ads.')
 
 
 def deactivate_ads(modeladmin, request, queryset):
-    queryset.update(status=POSTING_INACTIVE)
+    update_jobs(queryset, status=POSTING_INACTIVE)
 deactivate_ads.short_description = _('Deactivate selected ads.')
 
 
@@ -24,10 +29,63 @@ activate_ads_with_feeds.short_description = _('Activate selected ads and add to
 
 
 def mark_featured(modeladmin, request, queryset):
-    queryset.update(featured=True)
+    update_jobs(queryset, featured=True)
 mark_featured.short_description = _('Mark selected ads as featured.')
 
 
+def block_ips(modeladmin, request, queryset):
+    existing = set(BlockedIP.objects.values_list('network', flat=True))
+    ips = set(queryset.values_list('ip', flat=True)) - existing
+    # bulk_create sends no post_save, the blocklist is rebuilt once
+    BlockedIP.objects.bulk_create([BlockedIP(network=ip, reason=_('Blocked from the job stats.'))
+                                   for ip in ips])
+    if ips:
+        build_blocklist()
+block_ips.short_description = _('Block the IP addresses of the selected stats.')
+
+
+def export_action(name, export_format):
+    model, fields = EXPORTS[name]
+
+    def export(modeladmin, request, queryset):
+        return export_response(queryset, fields, export_format, name)
+    export.__name__ = 'export_%s_%s' % (name, export_format)
+    export.short_description = _('Export selected rows as %s.') % export_format.upper()
+    return export
+
+
+def estimate_row_count(model, using):
+    ''' Returns the number of rows of the model table as estimated by the
+        database statistics, or None when the backend has none.
+    '''
+    connection = connections[using]
+    table = model._meta.db_table
+    if connection.vendor == 'postgresql':
+        sql = 'SELECT reltuples FROM pg_class WHERE relname = %s'
+    elif connection.vendor == 'mysql':
+        sql = 'SELECT table_rows FROM information_schema.tables ' \
+              'WHERE table_schema = DATABASE() AND table_name = %s'
+    else:
+        return None
+    cursor = connection.cursor()
+    cursor.execute(sql, [table])
+    row = cursor.fetchone()
+    return row and row[0] is not None and int(row[0]) or None
+
+
+class EstimatedCountQuerySet(QuerySet):
+    ''' A queryset whose count() of the whole table is estimated once the
+        table is larger than LISTINGS_ADMIN_ESTIMATED_COUNT_THRESHOLD,
+        filtered counts stay exact.
+    '''
+    def count(self):
+        if not self.query.where and self._result_cache is None:
+            estimate = estimate_row_count(self.model, self.db)
+            if estimate and estimate > listings_settings.LISTINGS_ADMIN_ESTIMATED_COUNT_THRESHOLD:
+                return estimate
+        return super(EstimatedCountQuerySet, self).count()
+
+
 class FeedInline(admin.TabularInline):
     model = Feed.ads.through
 
@@ -42,11 +100,19 @@ class JobAdmin(admin.ModelAdmin):
         (_('Sites info'),  {'fields': ['sites']}),
     ]
     list_display = ('title', 'get_location', 'get_sites', 'company', 'created_on', 'get_status_with_icon', 'featured')
+    list_filter = ('status', 'featured', 'sites', 'category')
+    search_fields = ('title', 'company', 'poster_email')
     actions = [activate_ads, activate_ads_with_feeds, deactivate_ads, mark_featured]
     inlines = [
         FeedInline,
     ]
 
+    def queryset(self, request):
+        # get_location and get_sites read city and sites for every row
+        queryset = super(JobAdmin, self).queryset(request)
+        queryset = queryset._clone(klass=EstimatedCountQuerySet)
+        return queryset.select_related('city', 'category', 'jobtype').prefetch_related('sites')
+
 
 class CategoryAdmin(admin.ModelAdmin):
     prepopulated_fields = {'slug': ('name',)}
@@ -63,12 +129,36 @@ class CityAdmin(admin.ModelAdmin):
 
 class JobStatAdmin(admin.ModelAdmin):
     readonly_fields = ['description', 'job', 'created_on', 'ip', 'stat_type']
+    date_hierarchy = 'created_on'
+    list_filter = ['stat_type']
+    actions = [block_ips, export_action('stats', 'csv'), export_action('stats', 'ndjson')]
 
 
 class JobSearchAdmin(admin.ModelAdmin):
     readonly_fields = ['keywords', 'created_on']
+    date_hierarchy = 'created_on'
+    actions = [export_action('searches', 'csv'), export_action('searches', 'ndjson')]
+
+
+class ArchivedJobAdmin(admin.ModelAdmin):
+    list_display = ('title', 'company', 'created_on', 'archived_on')
+    readonly_fields = ['ad_url', 'title', 'company', 'company_slug', 'category_id', 'created_on', 'archived_on']
+
+
+class BlockedIPAdmin(admin.ModelAdmin):
+    list_display = ('network', 'reason', 'created_on')
+    search_fields = ('network', 'reason')
+
+
+class DuplicateJobAdmin(admin.ModelAdmin):
+    list_display = ('job', 'original', 'similarity', 'created_on')
+    raw_id_fields = ('job', 'original')
+
 
 admin.site.register(Type, TypeAdmin)
 admin.site.register(Job, JobAdmin)
 admin.site.register(JobStat, JobStatAdmin)
 admin.site.register(JobSearch, JobSearchAdmin)
+admin.site.register(ArchivedJob, ArchivedJobAdmin)
+admin.site.register(DuplicateJob, DuplicateJobAdmin)
+admin.site.register(BlockedIP, BlockedIPAdmin)
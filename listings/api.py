@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.http import HttpResponse, HttpResponseBadRequest
+
+from listings.models import Job
+from listings.helpers import get_job_path_format
+from listings.conf import settings as listings_settings
+
+from datetime import datetime
+import base64
+import json
+
+# public field name: values() lookup
+API_FIELDS = {
+    'id': 'pk',
+    'title': 'title',
+    'company': 'company',
+    'company_slug': 'company_slug',
+    'company_url': 'url',
+    'category': 'category__slug',
+    'jobtype': 'jobtype__slug',
+    'city': 'city__name',
+    'outside_location': 'outside_location',
+    'description': 'description',
+    'description_text': 'description_text',
+    'created_on': 'created_on',
+    'featured': 'featured',
+    'apply_online': 'apply_online',
+    'url': 'ad_url',
+}
+DEFAULT_FIELDS = ('id', 'title', 'company', 'category', 'jobtype', 'city',
+                  'outside_location', 'created_on', 'url')
+
+FILTERS = {
+    'category': 'category__slug',
+    'type': 'jobtype__slug',
+    'city': 'city__ascii_name',
+    'company': 'company_slug',
+}
+
+DATE_FORMATS = ('%Y-%m-%dT%H:%M:%S', '%Y-%m-%d')
+CURSOR_DATE_FORMAT = '%Y-%m-%dT%H:%M:%S.%f'
+
+
+class APIError(Exception):
+    pass
+
+
+def encode_cursor(created_on, pk):
+    return base64.urlsafe_b64encode('%s|%d' % (created_on.strftime(CURSOR_DATE_FORMAT), pk))
+
+
+def decode_cursor(cursor):
+    try:
+        created_on, pk = base64.urlsafe_b64decode(str(cursor)).split('|')
+        return datetime.strptime(created_on, CURSOR_DATE_FORMAT), int(pk)
+    except (TypeError, ValueError):
+        raise APIError('Invalid cursor.')
+
+
+def _parse_date(value):
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, date_format)
+        except ValueError:
+            pass
+    raise APIError('Invalid date: %s' % value)
+
+
+def _get_fields(params):
+    fields = params.get('fields')
+    if not fields:
+        return DEFAULT_FIELDS
+    fields = tuple(f.strip() for f in fields.split(',') if f.strip())
+    unknown = [f for f in fields if f not in API_FIELDS]
+    if unknown:
+        raise APIError('Unknown fields: %s' % ', '.join(unknown))
+    return fields
+
+
+def _get_limit(params):
+    try:
+        limit = int(params.get('limit', listings_settings.LISTINGS_API_PAGE_SIZE))
+    except ValueError:
+        raise APIError('Invalid limit.')
+    return max(1, min(limit, listings_settings.LISTINGS_API_MAX_PAGE_SIZE))
+
+
+def _get_queryset(params):
+    queryset = Job.active.all()
+    for param, lookup in FILTERS.items():
+        if params.get(param):
+            queryset = queryset.filter(**{lookup: params[param]})
+    if params.get('since'):
+        queryset = queryset.filter(created_on__gte=_parse_date(params['since']))
+    if params.get('cursor'):
+        created_on, pk = decode_cursor(params['cursor'])
+        queryset = queryset.filter(Q(created_on__lt=created_on) |
+                                   Q(created_on=created_on, pk__lt=pk))
+    return queryset.order_by('-created_on', '-pk')
+
+
+def _iter_json(rows, fields, limit, request):
+    ''' Yields the json document a chunk per job, so the page is never
+        held in memory as a whole.
+    '''
+    encoder = DjangoJSONEncoder()
+    job_path = get_job_path_format()
+    yield '{"jobs": ['
+    last = None
+    for i, row in enumerate(rows):
+        if i == limit:
+            # there's at least one more job
+            yield '], "next": %s}' % encoder.encode(encode_cursor(*last))
+            return
+        job = {}
+        for field in fields:
+            value = row[API_FIELDS[field]]
+            if field == 'url':
+                value = request.build_absolute_uri(job_path % {'pk': row['pk'], 'ad_url': value})
+            job[field] = value
+        yield (i and ', ' or '') + encoder.encode(job)
+        last = (row['created_on'], row['pk'])
+    yield '], "next": null}'
+
+
+def job_list(request):
+    ''' Lists the active jobs as json, newest first. Takes the category,
+        type, city, company and since filters, a comma separated list of
+        fields, a limit and the cursor returned as "next" by the previous
+        page. Rows are read with values(), no model is instantiated.
+    '''
+    params = request.GET
+    try:
+        fields = _get_fields(params)
+        limit = _get_limit(params)
+        queryset = _get_queryset(params)
+    except APIError as e:
+        return HttpResponseBadRequest(json.dumps({'error': unicode(e)}),
+                                      content_type='application/json')
+    lookups = set(API_FIELDS[f] for f in fields) | set(['pk', 'created_on', 'ad_url'])
+    rows = queryset.values(*lookups)[:limit + 1].iterator()
+    return HttpResponse(_iter_json(rows, fields, limit, request),
+                        content_type='application/json')
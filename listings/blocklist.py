@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+''' The blocked IP addresses, compiled into a file of sorted, disjoint
+    address ranges every worker loads into memory. Looking an address up is
+    a bisection, the file is only stat()ed every
+    LISTINGS_BLOCKLIST_CHECK_INTERVAL seconds to pick up a new build.
+'''
+
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponseForbidden
+
+from listings.conf import settings as listings_settings
+from listings.helpers import getIP
+
+import bisect
+import os
+import socket
+import struct
+import threading
+import time
+
+_IPV4_PREFIX = 0xffff << 32  # IPv4 addresses are mapped to ::ffff:0:0/96
+
+_lock = threading.Lock()
+_state = {'path': None, 'mtime': None, 'checked': 0, 'ranges': ([], [])}
+
+
+def ip_to_int(ip):
+    ''' Returns an IPv4 or IPv6 address as a 128 bit int, or None when it's
+        not a valid address.
+    '''
+    # getIP() returns X-Forwarded-For behind the local proxy: only the last
+    # entry, appended by the proxy, is not sent by the client itself
+    ip = ip.split(',')[-1].strip()
+    try:
+        if ':' in ip:
+            high, low = struct.unpack('!QQ', socket.inet_pton(socket.AF_INET6, ip))
+            return (high << 64) | low
+        return _IPV4_PREFIX | struct.unpack('!I', socket.inet_aton(ip))[0]
+    except (socket.error, ValueError, struct.error):
+        return None
+
+
+def network_range(network):
+    ''' Returns the (first, last) addresses of an address or a CIDR network,
+        e.g. 10.0.0.0/8, as ints.
+    '''
+    address, slash, prefix = network.strip().partition('/')
+    start = ip_to_int(address)
+    if start is None:
+        raise ValueError('Invalid address: %s' % network)
+    bits = ':' in address and 128 or 32
+    prefix = int(prefix) if slash else bits
+    if not 0 <= prefix <= bits:
+        raise ValueError('Invalid network: %s' % network)
+    host_mask = (1 << (bits - prefix)) - 1
+    start &= ~host_mask
+    return start, start | host_mask
+
+
+def merge_ranges(ranges):
+    ''' Sorts ranges and merges the overlapping or adjacent ones.
+    '''
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def write_blocklist(networks, path):
+    ''' Compiles the networks into the blocklist file, replacing it
+        atomically so the workers never read half a file. Returns the
+        number of ranges written.
+    '''
+    ranges = merge_ranges(network_range(n) for n in networks)
+    tmp_path = '%s.%d.tmp' % (path, os.getpid())
+    with open(tmp_path, 'w') as f:
+        for start, end in ranges:
+            f.write('%x %x\n' % (start, end))
+    os.rename(tmp_path, path)
+    return len(ranges)
+
+
+def _load(path):
+    starts, ends = [], []
+    with open(path) as f:
+        for line in f:
+            start, end = line.split()
+            starts.append(int(start, 16))
+            ends.append(int(end, 16))
+    return starts, ends
+
+
+def _refresh(path):
+    now = time.time()
+    if path == _state['path'] and now - _state['checked'] < listings_settings.LISTINGS_BLOCKLIST_CHECK_INTERVAL:
+        return
+    with _lock:
+        _state['checked'] = now
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            # not built yet
+            _state.update(path=path, mtime=None, ranges=([], []))
+            return
+        if path != _state['path'] or mtime != _state['mtime']:
+            _state.update(path=path, mtime=mtime, ranges=_load(path))
+
+
+def is_blocked(ip, path=None):
+    ''' Tells whether the address is in the blocklist file, never touching
+        the database.
+    '''
+    path = path or listings_settings.LISTINGS_BLOCKLIST_FILE
+    if not path:
+        return False
+    _refresh(path)
+    address = ip_to_int(ip or '')
+    if address is None:
+        return False
+    starts, ends = _state['ranges']
+    i = bisect.bisect_right(starts, address) - 1
+    return i >= 0 and address <= ends[i]
+
+
+class BlocklistMiddleware(object):
+    ''' Refuses the requests from blocked addresses before any view runs.
+        Put it first in MIDDLEWARE_CLASSES.
+    '''
+    def __init__(self):
+        if not listings_settings.LISTINGS_BLOCKLIST_FILE:
+            raise MiddlewareNotUsed
+
+    def process_request(self, request):
+        if is_blocked(getIP(request)):
+            return HttpResponseForbidden('Forbidden', content_type='text/plain')
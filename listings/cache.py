@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+
+from django.core.cache import cache
+
+import time
+
+# versions outlive the cached values built on them
+VERSION_TIMEOUT = 60 * 60 * 24 * 30
+
+
+def _version_key(name):
+    return 'listings:version:%s' % name
+
+
+def get_version(name):
+    ''' Returns the current version of the named cached content, used in
+        the cache keys so that bumping the version invalidates them.
+    '''
+    key = _version_key(name)
+    version = cache.get(key)
+    if version is None:
+        # start from the clock so an evicted version is never reused
+        version = int(time.time() * 1000)
+        cache.add(key, version, VERSION_TIMEOUT)
+        version = cache.get(key, version)
+    return version
+
+
+def get_versions(names):
+    ''' Returns a {name: version} dict, reading the versions with a single
+        cache request.
+    '''
+    keys = dict((_version_key(name), name) for name in names)
+    found = cache.get_many(keys.keys())
+    versions = {}
+    for key, name in keys.items():
+        if key in found:
+            versions[name] = found[key]
+        else:
+            versions[name] = get_version(name)
+    return versions
+
+
+def bump_version(name):
+    key = _version_key(name)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        version = int(time.time() * 1000)
+        cache.set(key, version, VERSION_TIMEOUT)
+        return version
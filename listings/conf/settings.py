@@ -18,7 +18,40 @@ LISTINGS_JOBS_PER_SEARCH = getattr(settings, 'LISTINGS_JOBS_PER_SEARCH', 25)
 LISTINGS_MAX_VISITS_PER_HOUR = getattr(settings, 'LISTINGS_MAX_VISITS_PER_HOUR', 1)
 LISTINGS_CAPTCHA_POST = getattr(settings, 'LISTINGS_CAPTCHA_POST', None)
 LISTINGS_CAPTCHA_APPLICATION = getattr(settings, 'LISTINGS_CAPTCHA_APPLICATION', None)
+LISTINGS_FEED_CACHE_TIMEOUT = getattr(settings, 'LISTINGS_FEED_CACHE_TIMEOUT', 60 * 60 * 24)
+LISTINGS_SITEMAP_PREGENERATE = getattr(settings, 'LISTINGS_SITEMAP_PREGENERATE', False)
+LISTINGS_SITEMAP_DIR = getattr(settings, 'LISTINGS_SITEMAP_DIR', 'sitemaps/')  # under MEDIA_ROOT
+LISTINGS_API_PAGE_SIZE = getattr(settings, 'LISTINGS_API_PAGE_SIZE', 100)
+LISTINGS_API_MAX_PAGE_SIZE = getattr(settings, 'LISTINGS_API_MAX_PAGE_SIZE', 1000)
+# 'database' searches a tsvector column on PostgreSQL or an FTS5 table on SQLite, see rebuild_search_index
+LISTINGS_SEARCH_BACKEND = getattr(settings, 'LISTINGS_SEARCH_BACKEND', None)
+LISTINGS_SEARCH_CONFIG = getattr(settings, 'LISTINGS_SEARCH_CONFIG', 'english')  # PostgreSQL text search configuration
+LISTINGS_BLOCKLIST_FILE = getattr(settings, 'LISTINGS_BLOCKLIST_FILE', None)  # compiled by build_blocklist
+LISTINGS_BLOCKLIST_CHECK_INTERVAL = getattr(settings, 'LISTINGS_BLOCKLIST_CHECK_INTERVAL', 5)  # seconds
+LISTINGS_BLOCKLIST_SPAM_THRESHOLD = getattr(settings, 'LISTINGS_BLOCKLIST_SPAM_THRESHOLD', 3)
+LISTINGS_BLOCKLIST_SPAM_DAYS = getattr(settings, 'LISTINGS_BLOCKLIST_SPAM_DAYS', 30)
+LISTINGS_TOP_JOBS_CACHE_TIMEOUT = getattr(settings, 'LISTINGS_TOP_JOBS_CACHE_TIMEOUT', 60 * 60 * 24)
+LISTINGS_ROW_CACHE_TIMEOUT = getattr(settings, 'LISTINGS_ROW_CACHE_TIMEOUT', 60 * 60)  # 0 disables it
+LISTINGS_SNAPSHOT = getattr(settings, 'LISTINGS_SNAPSHOT', False)  # needs a cache shared by the workers
+LISTINGS_SNAPSHOT_MAX_CHANGES = getattr(settings, 'LISTINGS_SNAPSHOT_MAX_CHANGES', 1000)
+LISTINGS_SNAPSHOT_MAX_AGE = getattr(settings, 'LISTINGS_SNAPSHOT_MAX_AGE', 60 * 60)  # seconds
+LISTINGS_GEO_GRID_SIZE = getattr(settings, 'LISTINGS_GEO_GRID_SIZE', 1.0)  # degrees
+LISTINGS_GEO_MAX_RADIUS = getattr(settings, 'LISTINGS_GEO_MAX_RADIUS', 500)  # km
+LISTINGS_SIMILAR_JOBS = getattr(settings, 'LISTINGS_SIMILAR_JOBS', 5)  # per job, computed by update_similar_jobs
+# 'flag' records the near-duplicates of a poster's active jobs, 'reject' refuses them
+LISTINGS_DEDUPE_POLICY = getattr(settings, 'LISTINGS_DEDUPE_POLICY', None)
+LISTINGS_DEDUPE_THRESHOLD = getattr(settings, 'LISTINGS_DEDUPE_THRESHOLD', 0.8)
+LISTINGS_ADMIN_ESTIMATED_COUNT_THRESHOLD = getattr(settings, 'LISTINGS_ADMIN_ESTIMATED_COUNT_THRESHOLD', 100000)
 LISTINGS_CV_EXTENSIONS = getattr(settings, 'LISTINGS_CV_EXTENSIONS', ('pdf', 'rtf', 'doc', 'docx', 'odt'))
+LISTINGS_JOB_LIFETIME = getattr(settings, 'LISTINGS_JOB_LIFETIME', None)  # days a job stays active, None for ever
+LISTINGS_SITE_INDEX = getattr(settings, 'LISTINGS_SITE_INDEX', False)  # run rebuild_site_listings before turning it on
+LISTINGS_ARCHIVE_AFTER = getattr(settings, 'LISTINGS_ARCHIVE_AFTER', None)  # days before inactive jobs are archived
+
+# Database routing settings, see listings.routers
+LISTINGS_READ_DATABASE = getattr(settings, 'LISTINGS_READ_DATABASE', None)
+LISTINGS_WRITE_DATABASE = getattr(settings, 'LISTINGS_WRITE_DATABASE', 'default')
+LISTINGS_ROUTED_APPS = getattr(settings, 'LISTINGS_ROUTED_APPS', ('listings', 'syndication', 'categories', 'cities_light'))
+LISTINGS_PRIMARY_PIN_SECONDS = getattr(settings, 'LISTINGS_PRIMARY_PIN_SECONDS', 15)
 
 
 def geturl(url_set, url, default):  # Custom URLs settings
@@ -56,11 +89,16 @@ LISTINGS_ADMIN_EMAIL = getattr(settings, 'LISTINGS_ADMIN_EMAIL', '')
 LISTINGS_ADMIN_NOTIFICATIONS = getattr(settings, 'LISTINGS_ADMIN_NOTIFICATIONS', False)
 LISTINGS_POSTER_NOTIFICATIONS = getattr(settings, 'LISTINGS_POSTER_NOTIFICATIONS', False)
 LISTINGS_APPLICATION_NOTIFICATIONS = getattr(settings, 'LISTINGS_APPLICATION_NOTIFICATIONS', False)
+# Minutes to collect admin notifications before mailing them in a single
+# digest (see the send_admin_digest command), None sends one mail per job.
+LISTINGS_ADMIN_DIGEST_INTERVAL = getattr(settings, 'LISTINGS_ADMIN_DIGEST_INTERVAL', None)
 
 LISTINGS_NEW_POST_ADMIN_SUBJECT = getattr(settings, 'LISTINGS_NEW_POST_ADMIN_SUBJECT', '[ %(site_name)s  ] New job: %(job_title)s')
 
 LISTINGS_EDIT_POST_ADMIN_SUBJECT = getattr(settings, 'LISTINGS_EDIT_POST_ADMIN_SUBJECT', '[ %(site_name)s  ] Edited job: %(job_title)s')
 
+LISTINGS_ADMIN_DIGEST_SUBJECT = getattr(settings, 'LISTINGS_ADMIN_DIGEST_SUBJECT', '[ %(site_name)s  ] %(count)d new or edited jobs')
+
 LISTINGS_MAIL_PENDING_SUBJECT = getattr(settings, 'LISTINGS_MAIL_PENDING_SUBJECT', 'Your ad on %(site_name)s')
 
 LISTINGS_MAIL_PUBLISH_SUBJECT = getattr(settings, 'LISTINGS_MAIL_PUBLISH_SUBJECT', 'Your ad on %(site_name)s was published')
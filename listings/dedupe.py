@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+''' MinHash signatures of job texts and their locality sensitive hashing
+    bands. Two texts share a band with a probability growing steeply with
+    the Jaccard similarity of their word shingles, so near-duplicates are
+    found by looking up the bands in an index instead of comparing every
+    pair of jobs.
+'''
+
+import random
+import re
+import zlib
+
+BANDS = 16
+ROWS = 4
+NUM_HASHES = BANDS * ROWS
+SHINGLE_SIZE = 3
+
+_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+# fixed seed, the signatures are stored and must be the same in every process
+_random = random.Random(0x5eed)
+_HASHES = [(_random.randint(1, _PRIME - 1), _random.randint(0, _PRIME - 1))
+           for i in range(NUM_HASHES)]
+
+_WORDS = re.compile(r'\w+', re.UNICODE)
+
+
+def shingles(text, size=SHINGLE_SIZE):
+    ''' Returns the set of hashed word shingles of a text.
+    '''
+    words = _WORDS.findall(text.lower())
+    if len(words) < size:
+        words = [u' '.join(words)]
+        size = 1
+    return set(zlib.crc32(u' '.join(words[i:i + size]).encode('utf-8')) & _MAX_HASH
+               for i in range(len(words) - size + 1))
+
+
+def minhash(text):
+    ''' Returns the MinHash signature of a text, a list of NUM_HASHES ints.
+    '''
+    hashed = shingles(text)
+    return [min((a * h + b) % _PRIME for h in hashed) & _MAX_HASH for a, b in _HASHES]
+
+
+def band_keys(signature):
+    ''' Returns one int per band of the signature, the band number in the
+        high bits, so the keys of different bands never collide.
+    '''
+    keys = []
+    for band in range(BANDS):
+        rows = signature[band * ROWS:(band + 1) * ROWS]
+        value = zlib.crc32(','.join(str(r) for r in rows).encode('ascii')) & _MAX_HASH
+        keys.append((band << 32) | value)
+    return keys
+
+
+def similarity(signature, other):
+    ''' Estimates the Jaccard similarity of the texts of two signatures.
+    '''
+    return sum(1 for a, b in zip(signature, other) if a == b) / float(NUM_HASHES)
+
+
+def job_text(title, description_text):
+    return u'%s\n%s' % (title, description_text)
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse
+
+from listings.models import JobStat, JobSearch
+
+import csv
+import datetime
+
+# name: (model, exported fields, the primary key first)
+EXPORTS = {
+    'stats': (JobStat, ('id', 'created_on', 'job', 'stat_type', 'ip', 'description')),
+    'searches': (JobSearch, ('id', 'created_on', 'keywords')),
+}
+FORMATS = ('csv', 'ndjson')
+CONTENT_TYPES = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+
+
+def iter_rows(queryset, fields, chunk_size=2000):
+    ''' Yields the values of the given fields for every row of the queryset.
+        Rows are read in primary key order by chunks, so memory use stays
+        the same whatever the number of rows.
+    '''
+    last_pk = None
+    while True:
+        chunk = queryset.order_by('pk')
+        if last_pk is not None:
+            chunk = chunk.filter(pk__gt=last_pk)
+        rows = list(chunk.values_list(*fields)[:chunk_size])
+        for row in rows:
+            yield row
+        if len(rows) < chunk_size:
+            return
+        last_pk = rows[-1][0]
+
+
+class _Echo(object):
+    def write(self, value):
+        return value
+
+
+def _to_csv(value):
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    return value
+
+
+def iter_csv(rows, fields):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(fields)
+    for row in rows:
+        yield writer.writerow([_to_csv(value) for value in row])
+
+
+def iter_ndjson(rows, fields):
+    encoder = DjangoJSONEncoder()
+    for row in rows:
+        yield encoder.encode(dict(zip(fields, row))) + '\n'
+
+
+def iter_export(queryset, fields, export_format):
+    rows = iter_rows(queryset, fields)
+    if export_format == 'csv':
+        return iter_csv(rows, fields)
+    return iter_ndjson(rows, fields)
+
+
+def export_response(queryset, fields, export_format, filename):
+    ''' A response streaming the export, for the admin actions.
+    '''
+    response = HttpResponse(iter_export(queryset, fields, export_format),
+                            content_type=CONTENT_TYPES[export_format])
+    response['Content-Disposition'] = 'attachment; filename=%s.%s' % (filename, export_format)
+    return response
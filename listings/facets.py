@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+
+from operator import itemgetter
+
+from listings.models import Type
+
+from categories.models import Category
+from cities_light.models import City
+
+
+FACET_FIELDS = ('category', 'jobtype', 'city', 'company')
+
+
+def get_facet_counts(queryset):
+    ''' Returns how many jobs of the given queryset fall in each category,
+        job type, city and company. All four facets are counted from a
+        single query and a single pass over its rows instead of running
+        one GROUP BY per facet, see count_facets.
+    '''
+    return count_facets(queryset.values_list('category', 'jobtype', 'city',
+                                             'company_slug', 'company'))
+
+
+def count_facets(rows):
+    ''' Counts the facets of (category, jobtype, city, company_slug,
+        company) rows.
+
+        The result is a dict keyed by facet name whose values are lists of
+        (value, count) tuples sorted by count; values are Category, Type
+        and City instances, and dicts with 'company' and 'company_slug'
+        keys for the company facet.
+    '''
+    counts = dict((facet, {}) for facet in FACET_FIELDS)
+    company_names = {}
+    for category_id, jobtype_id, city_id, company_slug, company in rows:
+        for facet, key in (('category', category_id),
+                           ('jobtype', jobtype_id),
+                           ('city', city_id),
+                           ('company', company_slug)):
+            if key is not None:
+                counts[facet][key] = counts[facet].get(key, 0) + 1
+        company_names.setdefault(company_slug, company)
+
+    objects = {
+        'category': Category.objects.in_bulk(counts['category'].keys()),
+        'jobtype': Type.objects.in_bulk(counts['jobtype'].keys()),
+        'city': City.objects.in_bulk(counts['city'].keys()),
+        'company': dict((slug, {'company': name, 'company_slug': slug})
+                        for slug, name in company_names.items()),
+    }
+
+    facets = {}
+    for facet in FACET_FIELDS:
+        values = [(objects[facet][key], count)
+                  for key, count in counts[facet].items()
+                  if key in objects[facet]]
+        values.sort(key=itemgetter(1), reverse=True)
+        facets[facet] = values
+    return facets
@@ -3,13 +3,48 @@
 from django.contrib.syndication.views import Feed
 from django.shortcuts import get_object_or_404
 from django.core.urlresolvers import reverse
+from django.core.cache import cache
+from django.conf import settings as django_settings
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import http_date, parse_http_date_safe
 from django.utils.translation import ugettext_lazy as _
 from listings.models import Job
+from listings.cache import get_version
 from categories.models import Category
-from listings.conf.settings import LISTINGS_SITE_NAME
+from listings.conf.settings import LISTINGS_SITE_NAME, LISTINGS_FEED_CACHE_TIMEOUT
+
+try:
+    from hashlib import md5
+except ImportError:
+    from md5 import md5
+import time
 
 
 class LatestJobsFeed(Feed):
+    ''' The latest jobs, of a category or of 'all' of them. The generated
+        feeds are cached until a job of their category is activated,
+        deactivated or edited while active, see listings.receivers.
+    '''
+
+    def __call__(self, request, slug):
+        key = 'listings:feed:%s:%s:%s' % (django_settings.SITE_ID, slug, get_version('feed:%s' % slug))
+        cached = cache.get(key)
+        if cached is None:
+            response = super(LatestJobsFeed, self).__call__(request, slug=slug)
+            cached = (response.content, response['Content-Type'], int(time.time()),
+                      '"%s"' % md5(response.content).hexdigest())
+            cache.set(key, cached, LISTINGS_FEED_CACHE_TIMEOUT)
+        content, content_type, last_modified, etag = cached
+
+        modified_since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+        if request.META.get('HTTP_IF_NONE_MATCH') == etag or \
+           (modified_since and modified_since >= last_modified):
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(content, content_type=content_type)
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        return response
 
     def get_object(self, request, slug):
         if slug == 'all':
@@ -20,7 +55,7 @@ class LatestJobsFeed(Feed):
     def title(self, obj=None):
         t = _(' %(site_name)s RSS Job feed') % {'site_name': LISTINGS_SITE_NAME}
         if obj:
-            t += _(': %(category)s jobs') % {'site_name': obj}
+            t += _(': %(category)s jobs') % {'category': obj}
         return t
 
     def link(self, obj=None):
@@ -39,5 +74,9 @@ class LatestJobsFeed(Feed):
         jobs = Job.active.all()
         if obj:
             jobs = jobs.filter(category=obj)
-        jobs = jobs.order_by('created_on')[:30]
+        # newest first, served by the created_on index
+        jobs = jobs.order_by('-created_on')[:30]
         return jobs
+
+    def item_pubdate(self, item):
+        return item.created_on
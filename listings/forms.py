@@ -1,7 +1,9 @@
 # -*- coding: utf-8 -*-
 
 
-from listings.models import Job, JobStat
+from listings.models import Job, JobStat, find_duplicates
+from listings.helpers import render_description
+from listings import dedupe
 from listings.conf import settings as listings_settings
 
 from django.utils.safestring import mark_safe
@@ -47,6 +49,19 @@ class JobForm(forms.ModelForm):
         choices.extend([(_city.pk, unicode(_city.name)) for _city in city.queryset.all()])
         self.fields['city'].choices = choices
 
+    def clean(self):
+        cleaned_data = super(JobForm, self).clean()
+        fields = ('title', 'description', 'poster_email')
+        if listings_settings.LISTINGS_DEDUPE_POLICY == 'reject' and all(cleaned_data.get(f) for f in fields):
+            description, description_text = render_description(cleaned_data['description'])
+            text = dedupe.job_text(cleaned_data['title'], description_text)
+            signature = dedupe.minhash(text)
+            # saved by the job_saved receiver without computing it again
+            self.instance._dedupe_signature = (text, signature)
+            if find_duplicates(signature, cleaned_data['poster_email'], exclude=self.instance.pk):
+                raise forms.ValidationError(_('You already published a job almost the same as this one.'))
+        return cleaned_data
+
 
 class CaptchaJobForm(JobForm):
     if listings_settings.LISTINGS_CAPTCHA_POST == "simple":
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+''' A grid index of the city coordinates, to find the cities within a
+    radius of a point without computing the distance to every city: only
+    the grid cells overlapping the bounding box of the circle are visited,
+    and the points inside the box are then checked with the haversine
+    formula.
+'''
+
+from listings.conf import settings as listings_settings
+
+import math
+import threading
+
+EARTH_RADIUS = 6371.0  # km
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    ''' Returns the great circle distance between two points in km.
+    '''
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + \
+        math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS * math.asin(min(1.0, math.sqrt(a)))
+
+
+def bounding_box(lat, lon, radius):
+    ''' Returns the (min lat, max lat, longitude half width) of the box
+        around a circle, the half width being None when the circle covers
+        every longitude, e.g. around a pole.
+    '''
+    distance = radius / EARTH_RADIUS
+    min_lat = lat - math.degrees(distance)
+    max_lat = lat + math.degrees(distance)
+    if min_lat <= -90 or max_lat >= 90:
+        return max(min_lat, -90), min(max_lat, 90), None
+    ratio = math.sin(distance) / math.cos(math.radians(lat))
+    if ratio >= 1:
+        return min_lat, max_lat, None
+    return min_lat, max_lat, math.degrees(math.asin(ratio))
+
+
+class CityGrid(object):
+    ''' The cities bucketed by cells of cell_size degrees.
+    '''
+    def __init__(self, cities, cell_size=1.0):
+        self.cell_size = cell_size
+        self.columns = int(math.ceil(360 / cell_size))
+        self.cells = {}
+        for city_id, lat, lon in cities:
+            self.cells.setdefault(self._cell(lat, lon), []).append((city_id, lat, lon))
+
+    def _row(self, lat):
+        return int(math.floor((lat + 90) / self.cell_size))
+
+    def _column(self, lon):
+        return int(math.floor((lon + 180) / self.cell_size)) % self.columns
+
+    def _cell(self, lat, lon):
+        return self._row(lat), self._column(lon)
+
+    def _columns(self, lon, half_width):
+        if half_width is None or 2 * half_width >= 360 - self.cell_size:
+            return range(self.columns)
+        first = self._column(lon - half_width)
+        count = (self._column(lon + half_width) - first) % self.columns + 1
+        return [(first + i) % self.columns for i in range(count)]
+
+    def within(self, lat, lon, radius):
+        ''' Returns a {city id: distance in km} dict of the cities at most
+            radius km away from the point.
+        '''
+        min_lat, max_lat, half_width = bounding_box(lat, lon, radius)
+        columns = self._columns(lon, half_width)
+        found = {}
+        for row in range(self._row(min_lat), self._row(max_lat) + 1):
+            for column in columns:
+                for city_id, city_lat, city_lon in self.cells.get((row, column), ()):
+                    if not min_lat <= city_lat <= max_lat:
+                        continue
+                    if half_width is not None and abs((city_lon - lon + 180) % 360 - 180) > half_width:
+                        continue
+                    distance = haversine(lat, lon, city_lat, city_lon)
+                    if distance <= radius:
+                        found[city_id] = distance
+        return found
+
+
+_lock = threading.Lock()
+_grids = {}
+
+
+def get_city_grid():
+    ''' Returns the grid of the cities of the current site that have active
+        jobs and coordinates. It is kept per process and rebuilt only when
+        a city gets its first job or loses its last one, from the job counts.
+    '''
+    from django.conf import settings as django_settings
+    from listings.models import get_job_counts
+    site_id = django_settings.SITE_ID
+    city_ids = frozenset(pk for pk in get_job_counts('city') if pk)
+    ids, grid = _grids.get(site_id, (None, None))
+    if ids != city_ids:
+        from cities_light.models import City
+        with _lock:
+            ids, grid = _grids.get(site_id, (None, None))
+            if ids != city_ids:
+                rows = City.objects.filter(pk__in=city_ids).exclude(latitude=None).exclude(longitude=None) \
+                                   .values_list('pk', 'latitude', 'longitude')
+                grid = CityGrid(((pk, float(lat), float(lon)) for pk, lat, lon in rows),
+                                listings_settings.LISTINGS_GEO_GRID_SIZE)
+                _grids[site_id] = (city_ids, grid)
+    return grid
+
+
+def cities_within(city, radius):
+    ''' Returns a {city id: distance in km} dict of the cities at most
+        radius km away from the city, the city itself included.
+    '''
+    if city.latitude is None or city.longitude is None:
+        return {city.pk: 0.0}
+    found = get_city_grid().within(float(city.latitude), float(city.longitude), radius)
+    found[city.pk] = 0.0
+    return found
@@ -1,13 +1,18 @@
 # -*- coding: utf-8 -*-
 
 from django.db.models import Q
+from django.core.urlresolvers import reverse
+from django.utils.safestring import mark_safe
+from django.utils.encoding import smart_str, force_unicode
+from django.utils.html import strip_tags
 from datetime import datetime, timedelta
 
 from listings.conf import settings as listings_settings
-from bs4 import BeautifulSoup as bs, Comment
 
+from collections import OrderedDict
 import re
 import os
+import threading
 
 
 def normalize_query(query_string,
@@ -49,6 +54,14 @@ def get_query(query_string, search_fields):
     return query
 
 
+def get_job_path_format():
+    ''' Returns the path of the job detail page as a format string taking
+        'pk' and 'ad_url', to build many job urls with a single reverse().
+    '''
+    path = reverse('listings_ad_detail', kwargs={'pk': 918273645, 'ad_url': 'job-path-ad-url'})
+    return path.replace('%', '%%').replace('918273645', '%(pk)d').replace('job-path-ad-url', '%(ad_url)s')
+
+
 def handle_uploaded_file(f, name):
     file_uploads = listings_settings.LISTINGS_FILE_UPLOADS
     destination = open(file_uploads + name, 'wb+')
@@ -83,6 +96,8 @@ def getIP(request):
 
 #  adapted from http://ygamretuta.me/2012/06/27/django-strip-tags-php/
 def strip_disallowed_tags(value):
+    # bs4 is only needed when a job is saved, so it's not loaded on import
+    from bs4 import BeautifulSoup as bs, Comment
     soup = bs(value)
 
     # remove comments
@@ -95,3 +110,93 @@ def strip_disallowed_tags(value):
             tag.unwrap()
 
     return soup.prettify()
+
+
+_markup_converters = threading.local()
+
+
+def get_markup_converter(language):
+    ''' Returns a callable that converts text written in the given markup
+        language ('textile', 'markdown' or 'html') to html. Converters are
+        built once per thread and reused afterwards, a markdown instance
+        keeps state while converting so threads can't share one.
+    '''
+    converters = getattr(_markup_converters, 'converters', None)
+    if converters is None:
+        converters = _markup_converters.converters = {}
+    if language not in converters:
+        if language == 'textile':
+            import textile
+            converter = textile.textile
+        elif language == 'markdown':
+            import markdown
+            md = markdown.Markdown()
+
+            def converter(text):
+                return md.reset().convert(text)
+        elif language == 'html':
+            import django_wysiwyg
+            converter = django_wysiwyg.clean_html
+        else:
+            converter = None
+        converters[language] = converter
+    return converters[language]
+
+
+def render_description(description):
+    ''' Renders a job description with the markup language set in
+        LISTINGS_MARKUP_LANGUAGE and strips the tags that are not allowed.
+        Returns a (description, description_text) tuple.
+    '''
+    description_text = strip_tags(description)
+    language = listings_settings.LISTINGS_MARKUP_LANGUAGE
+
+    # textile and markdown work on byte strings
+    if language in ('textile', 'markdown'):
+        converter = get_markup_converter(language)
+        description = mark_safe(force_unicode(converter(smart_str(description))))
+    # or wysiwyg
+    elif language == 'html':
+        converter = get_markup_converter(language)
+        description = mark_safe(force_unicode(converter(description)))
+    # or else, disallow all markup
+    else:
+        description = description_text
+
+    return strip_disallowed_tags(description), description_text
+
+
+class LRUCache(object):
+    ''' A small thread safe mapping that keeps at most `size` items,
+        discarding the least recently used ones first.
+    '''
+    def __init__(self, size):
+        self.size = size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value = self._data.pop(key)
+            except KeyError:
+                return default
+            self._data[key] = value
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = value
+            while len(self._data) > self.size:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+
+from django.core.management.base import NoArgsCommand, CommandError
+
+from listings.models import build_blocklist
+from listings.conf import settings as listings_settings
+
+
+class Command(NoArgsCommand):
+    help = 'Compiles the blocked IPs and the addresses often reported as ' \
+           'spam into LISTINGS_BLOCKLIST_FILE. Meant to be run from cron, ' \
+           'the blocked IPs edited in the admin are applied right away.'
+
+    def handle_noargs(self, **options):
+        if not listings_settings.LISTINGS_BLOCKLIST_FILE:
+            raise CommandError('LISTINGS_BLOCKLIST_FILE is not set.')
+        count = build_blocklist()
+        self.stdout.write('Wrote %d address range(s) to %s\n' % (count, listings_settings.LISTINGS_BLOCKLIST_FILE))
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from listings.models import (Job, JobSignature, DuplicateJob, POSTING_ACTIVE, POSTING_INACTIVE,
+                             update_jobs, save_job_signature, find_duplicates)
+from listings import dedupe
+
+from optparse import make_option
+
+
+class Command(BaseCommand):
+    help = 'Computes the signature of every active job and flags the jobs ' \
+           'nearly the same as an older active job of the same poster.'
+
+    option_list = BaseCommand.option_list + (
+        make_option('--chunk-size', dest='chunk_size', type='int', default=500,
+                    help='Number of jobs read at once.'),
+        make_option('--deactivate', dest='deactivate', action='store_true', default=False,
+                    help='Deactivate the duplicates, keeping the oldest job active.'),
+    )
+
+    def _chunks(self, queryset, fields, chunk_size):
+        last_pk = 0
+        while True:
+            rows = list(queryset.filter(pk__gt=last_pk).order_by('pk').values_list('pk', *fields)[:chunk_size])
+            if not rows:
+                return
+            yield rows
+            last_pk = rows[-1][0]
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        if chunk_size < 1:
+            raise CommandError('--chunk-size must be a positive number.')
+        active = Job.objects.filter(status=POSTING_ACTIVE)
+
+        signed = 0
+        for rows in self._chunks(active, ('title', 'description_text'), chunk_size):
+            with transaction.commit_on_success():
+                for pk, title, description_text in rows:
+                    save_job_signature(pk, dedupe.minhash(dedupe.job_text(title, description_text)))
+            signed += len(rows)
+        self.stdout.write('Computed the signature of %d job(s)\n' % signed)
+
+        flagged = []
+        for rows in self._chunks(active, ('created_on', 'poster_email'), chunk_size):
+            signatures = JobSignature.objects.in_bulk([row[0] for row in rows])
+            for pk, created_on, poster_email in rows:
+                if pk not in signatures:
+                    continue
+                duplicates = find_duplicates(signatures[pk].get_minhash(), poster_email, exclude=pk)
+                if not duplicates:
+                    continue
+                # only an older job is the original
+                originals = dict(Job.objects.filter(pk__in=[d[0] for d in duplicates])
+                                 .values_list('pk', 'created_on'))
+                duplicates = [(original_id, score) for original_id, score in duplicates
+                              if (originals.get(original_id), original_id) < (created_on, pk)]
+                if duplicates:
+                    DuplicateJob.objects.filter(job=pk).delete()
+                    DuplicateJob.objects.create(job_id=pk, original_id=duplicates[0][0],
+                                                similarity=duplicates[0][1])
+                    flagged.append(pk)
+        self.stdout.write('Flagged %d duplicate job(s)\n' % len(flagged))
+
+        if options['deactivate'] and flagged:
+            count = 0
+            for i in range(0, len(flagged), options['chunk_size']):
+                chunk = flagged[i:i + options['chunk_size']]
+                count += update_jobs(Job.objects.filter(pk__in=chunk), status=POSTING_INACTIVE)
+            self.stdout.write('Deactivated %d duplicate job(s)\n' % count)
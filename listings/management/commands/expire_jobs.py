@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from listings.models import Job, ArchivedJob, POSTING_ACTIVE, POSTING_INACTIVE, update_jobs
+from listings.conf import settings as listings_settings
+
+from datetime import datetime, timedelta
+from optparse import make_option
+
+ARCHIVED_FIELDS = ('id', 'ad_url', 'title', 'company', 'company_slug',
+                   'category_id', 'created_on')
+
+
+class Command(BaseCommand):
+    help = 'Deactivates the jobs older than LISTINGS_JOB_LIFETIME days and ' \
+           'moves the inactive jobs older than LISTINGS_ARCHIVE_AFTER days ' \
+           'to the archive table. Meant to be run daily from cron.'
+
+    option_list = BaseCommand.option_list + (
+        make_option('--chunk-size', dest='chunk_size', type='int', default=1000,
+                    help='Number of jobs deactivated or archived at once.'),
+    )
+
+    def handle(self, *args, **options):
+        now = datetime.now()
+        lifetime = listings_settings.LISTINGS_JOB_LIFETIME
+        archive_after = listings_settings.LISTINGS_ARCHIVE_AFTER
+
+        if lifetime:
+            expired = Job.objects.filter(status=POSTING_ACTIVE,
+                                         created_on__lt=now - timedelta(days=lifetime))
+            count = update_jobs(expired, chunk_size=options['chunk_size'], status=POSTING_INACTIVE)
+            self.stdout.write('Deactivated %d expired job(s)\n' % count)
+
+        if archive_after:
+            old = Job.objects.filter(status=POSTING_INACTIVE,
+                                     created_on__lt=now - timedelta(days=archive_after))
+            archived = 0
+            while True:
+                rows = list(old.order_by('pk').values(*ARCHIVED_FIELDS)[:options['chunk_size']])
+                if not rows:
+                    break
+                with transaction.commit_on_success():
+                    ArchivedJob.objects.bulk_create([ArchivedJob(archived_on=now, **row) for row in rows])
+                    Job.objects.filter(pk__in=[row['id'] for row in rows]).delete()
+                archived += len(rows)
+            self.stdout.write('Archived %d inactive job(s)\n' % archived)
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+
+from django.core.management.base import BaseCommand, CommandError
+
+from listings.exports import EXPORTS, FORMATS, iter_export
+
+from datetime import datetime
+from optparse import make_option
+import sys
+
+
+def _parse_date(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d')
+    except ValueError:
+        raise CommandError('Dates must be given as YYYY-MM-DD: %s' % value)
+
+
+class Command(BaseCommand):
+    args = '<%s>' % '|'.join(sorted(EXPORTS))
+    help = 'Exports job stats or searches as csv or ndjson, streaming the rows ' \
+           'so memory use stays the same whatever the export size.'
+
+    option_list = BaseCommand.option_list + (
+        make_option('--format', dest='format', default='csv',
+                    help='Output format: %s.' % ', '.join(FORMATS)),
+        make_option('--since', dest='since', default=None,
+                    help='Only rows created on or after this date (YYYY-MM-DD).'),
+        make_option('--until', dest='until', default=None,
+                    help='Only rows created before this date (YYYY-MM-DD).'),
+        make_option('--output', dest='output', default=None,
+                    help='File to write to, the standard output by default.'),
+    )
+
+    def handle(self, *args, **options):
+        if len(args) != 1 or args[0] not in EXPORTS:
+            raise CommandError('Usage: export_stats %s' % self.args)
+        if options['format'] not in FORMATS:
+            raise CommandError('Unknown format: %s' % options['format'])
+        model, fields = EXPORTS[args[0]]
+
+        queryset = model.objects.all()
+        if options['since']:
+            queryset = queryset.filter(created_on__gte=_parse_date(options['since']))
+        if options['until']:
+            queryset = queryset.filter(created_on__lt=_parse_date(options['until']))
+
+        output = options['output'] and open(options['output'], 'wb') or sys.stdout
+        try:
+            for chunk in iter_export(queryset, fields, options['format']):
+                output.write(chunk)
+        finally:
+            if output is not sys.stdout:
+                output.close()
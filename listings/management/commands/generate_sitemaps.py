@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from listings import sitemaps
+from listings.cache import get_version
+from listings.conf import settings as listings_settings
+
+from optparse import make_option
+import os
+import urlparse
+
+
+class Command(BaseCommand):
+    help = 'Writes the gzipped sitemaps and their index to LISTINGS_SITEMAP_DIR ' \
+           'under MEDIA_ROOT, so the web server can serve them as static files.'
+
+    option_list = BaseCommand.option_list + (
+        make_option('--if-changed', action='store_true', dest='if_changed', default=False,
+                    help='Only regenerate when the active jobs changed since the last run.'),
+    )
+
+    def handle(self, *args, **options):
+        directory = os.path.join(settings.MEDIA_ROOT, listings_settings.LISTINGS_SITEMAP_DIR)
+        version_file = os.path.join(directory, '.version')
+        version = str(get_version('sitemaps'))
+        if options['if_changed'] and os.path.exists(version_file) and \
+           open(version_file).read().strip() == version:
+            return
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+        base_url = urlparse.urljoin(sitemaps._base_url(), settings.MEDIA_URL)
+
+        def location(section, page):
+            return urlparse.urljoin(base_url, '%ssitemap-%s-%d.xml.gz' %
+                                    (listings_settings.LISTINGS_SITEMAP_DIR, section, page))
+
+        files = 0
+        for section in sitemaps.SECTIONS:
+            for page in range(1, sitemaps.get_page_count(section) + 1):
+                self._write(os.path.join(directory, 'sitemap-%s-%d.xml.gz' % (section, page)),
+                            sitemaps.iter_sitemap(section, page))
+                files += 1
+        self._write(os.path.join(directory, 'sitemap.xml.gz'),
+                    sitemaps.iter_sitemap_index(location))
+        with open(version_file, 'w') as f:
+            f.write(version)
+        self.stdout.write('Wrote %d sitemap(s) and their index to %s\n' % (files, directory))
+
+    def _write(self, path, chunks):
+        # write aside and rename so the web server never serves half a file
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            for data in sitemaps.gzip_stream(chunks):
+                f.write(data)
+        os.rename(tmp_path, path)
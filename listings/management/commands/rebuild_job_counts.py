@@ -0,0 +1,15 @@
+# -*- coding: utf-8 -*-
+
+from django.core.management.base import NoArgsCommand
+from django.db import transaction
+
+from listings.models import refresh_job_counts
+
+
+class Command(NoArgsCommand):
+    help = 'Recounts the active jobs by site, category, job type and city.'
+
+    def handle_noargs(self, **options):
+        with transaction.commit_on_success():
+            refresh_job_counts()
+        self.stdout.write('Job counts rebuilt\n')
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+
+from django.core.management.base import NoArgsCommand, CommandError
+
+from listings.search import create_search_index, index_jobs, is_enabled
+
+
+class Command(NoArgsCommand):
+    help = 'Creates the full-text index of the jobs if missing, a tsvector ' \
+           'column on PostgreSQL or an FTS5 table on SQLite, and reindexes ' \
+           'every active job. Needed once when LISTINGS_SEARCH_BACKEND is ' \
+           'set to \'database\' on an existing database.'
+
+    def handle_noargs(self, **options):
+        if not is_enabled():
+            raise CommandError('LISTINGS_SEARCH_BACKEND is not \'database\'.')
+        if create_search_index():
+            self.stdout.write('Search index created\n')
+        index_jobs()
+        self.stdout.write('Search index rebuilt\n')
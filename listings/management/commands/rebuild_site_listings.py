@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from listings.models import Job, sync_site_listings
+
+from optparse import make_option
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the SiteListing table used when LISTINGS_SITE_INDEX is on.'
+
+    option_list = BaseCommand.option_list + (
+        make_option('--chunk-size', dest='chunk_size', type='int', default=1000,
+                    help='Number of jobs indexed per transaction.'),
+    )
+
+    def handle(self, *args, **options):
+        last_pk = 0
+        done = 0
+        while True:
+            pks = list(Job.objects.filter(pk__gt=last_pk).order_by('pk')
+                       .values_list('pk', flat=True)[:options['chunk_size']])
+            if not pks:
+                break
+            with transaction.commit_on_success():
+                sync_site_listings(pks)
+            last_pk = pks[-1]
+            done += len(pks)
+        self.stdout.write('Indexed %d job(s)\n' % done)
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from listings.models import Job
+from listings.signals import jobs_updated
+from listings.helpers import get_markup_converter, render_description
+from listings.conf import settings as listings_settings
+
+from optparse import make_option
+import multiprocessing
+import os
+import time
+
+
+def _init_worker():
+    # build the markup converter once per worker process
+    get_markup_converter(listings_settings.LISTINGS_MARKUP_LANGUAGE)
+
+
+def _render(row):
+    pk, description = row
+    description, description_text = render_description(description)
+    return (description, description_text, pk)
+
+
+class Command(BaseCommand):
+    help = 'Re-renders and re-sanitizes the description of every job using ' \
+           'the current LISTINGS_MARKUP_LANGUAGE and LISTINGS_ALLOWED_TAGS.'
+
+    option_list = BaseCommand.option_list + (
+        make_option('--chunk-size', dest='chunk_size', type='int', default=500,
+                    help='Number of jobs fetched and written back at once.'),
+        make_option('--processes', dest='processes', type='int', default=None,
+                    help='Number of worker processes, defaults to the number of CPUs.'),
+        make_option('--state-file', dest='state_file', default=None,
+                    help='File used to remember the last processed job, so an '
+                         'interrupted run can be resumed.'),
+    )
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        state_file = options['state_file']
+        if chunk_size < 1:
+            raise CommandError('--chunk-size must be a positive number.')
+
+        last_pk = 0
+        if state_file and os.path.exists(state_file):
+            last_pk = int(open(state_file).read().strip() or 0)
+            self.stdout.write('Resuming after job %d\n' % last_pk)
+
+        total = Job.objects.filter(pk__gt=last_pk).count()
+        table = connection.ops.quote_name(Job._meta.db_table)
+        sql = 'UPDATE %s SET %s = %%s, %s = %%s WHERE %s = %%s' % (
+            table,
+            connection.ops.quote_name('description'),
+            connection.ops.quote_name('description_text'),
+            connection.ops.quote_name(Job._meta.pk.column))
+
+        # workers never touch the database, don't let them inherit the socket
+        connection.close()
+        pool = multiprocessing.Pool(options['processes'], initializer=_init_worker)
+
+        done = 0
+        start = time.time()
+        try:
+            while True:
+                rows = list(Job.objects.filter(pk__gt=last_pk).order_by('pk')
+                            .values_list('pk', 'description')[:chunk_size])
+                if not rows:
+                    break
+                rendered = pool.map(_render, rows)
+                with transaction.commit_on_success():
+                    connection.cursor().executemany(sql, rendered)
+                # the raw update skips Job.save, tell the indexes and caches
+                jobs_updated.send(sender=Job, pks=[row[0] for row in rows],
+                                  fields=['description', 'description_text'])
+                last_pk = rows[-1][0]
+                done += len(rows)
+                if state_file:
+                    with open(state_file, 'w') as f:
+                        f.write(str(last_pk))
+                elapsed = time.time() - start
+                self.stdout.write('%d/%d jobs re-rendered, %.1f jobs/s, last job %d\n' %
+                                  (done, total, done / max(elapsed, 0.001), last_pk))
+        finally:
+            pool.close()
+            pool.join()
+
+        if state_file and os.path.exists(state_file):
+            os.remove(state_file)
+        self.stdout.write('Done: %d jobs in %.1fs\n' % (done, time.time() - start))
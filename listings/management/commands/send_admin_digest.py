@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+
+from django.core.management.base import BaseCommand
+
+from listings.models import AdminNotification
+from listings.postman import MailAdminDigest
+from listings.conf import settings as listings_settings
+
+from datetime import datetime, timedelta
+from optparse import make_option
+
+
+class Command(BaseCommand):
+    help = 'Mails the pending admin notifications in a single digest once the ' \
+           'oldest one has waited LISTINGS_ADMIN_DIGEST_INTERVAL minutes. ' \
+           'Meant to be run every few minutes from cron.'
+
+    option_list = BaseCommand.option_list + (
+        make_option('--force', action='store_true', dest='force', default=False,
+                    help='Send the digest even if the interval has not elapsed.'),
+    )
+
+    def handle(self, *args, **options):
+        notifications = list(AdminNotification.objects.select_related('job'))
+        if not notifications:
+            return
+        interval = listings_settings.LISTINGS_ADMIN_DIGEST_INTERVAL or 0
+        due = datetime.now() - timedelta(minutes=interval)
+        if not options['force'] and notifications[0].created_on > due:
+            return
+        MailAdminDigest(notifications).run()
+        AdminNotification.objects.filter(pk__in=[n.pk for n in notifications]).delete()
+        self.stdout.write('Sent a digest with %d notification(s)\n' % len(notifications))
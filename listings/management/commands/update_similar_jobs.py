@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+
+from django.core.management.base import BaseCommand, CommandError
+
+from listings.models import PendingSimilarJob
+from listings.similar import is_available, update_similar_jobs
+from listings.conf import settings as listings_settings
+
+from optparse import make_option
+import time
+
+
+class Command(BaseCommand):
+    help = 'Computes the LISTINGS_SIMILAR_JOBS most similar active jobs of ' \
+           'the jobs activated, deactivated or edited since the last run. ' \
+           'Needs numpy and scipy.'
+
+    option_list = BaseCommand.option_list + (
+        make_option('--all', dest='all', action='store_true', default=False,
+                    help='Recompute the similar jobs of every active job.'),
+        make_option('--batch-size', dest='batch_size', type='int', default=200,
+                    help='Number of jobs compared to the others at once.'),
+    )
+
+    def handle(self, *args, **options):
+        k = listings_settings.LISTINGS_SIMILAR_JOBS
+        if not k:
+            raise CommandError('LISTINGS_SIMILAR_JOBS is 0.')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be a positive number.')
+        if not is_available():
+            raise CommandError('numpy and scipy are needed, see optional-requirements.txt.')
+
+        start = time.time()
+        # jobs marked while this runs are kept for the next run
+        pending = list(PendingSimilarJob.objects.values_list('job', flat=True))
+        if options['all']:
+            count = update_similar_jobs(k, batch_size=options['batch_size'])
+        elif pending:
+            count = update_similar_jobs(k, pending, batch_size=options['batch_size'])
+        else:
+            count = 0
+        PendingSimilarJob.objects.filter(job__in=pending).delete()
+        self.stdout.write('Updated the similar jobs of %d job(s) in %.1fs\n' % (count, time.time() - start))
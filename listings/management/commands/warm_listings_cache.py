@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+
+from django.contrib.sites.models import Site
+from django.core import signals
+from django.core.handlers.base import BaseHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.core.urlresolvers import reverse
+from django.db.models import Count
+from django.test.client import RequestFactory
+
+from listings.models import Job, JobStat, get_job_counts
+from listings.cache import get_version
+
+from categories.models import Category
+from cities_light.models import City
+
+from datetime import datetime, timedelta
+from multiprocessing.pool import ThreadPool
+from optparse import make_option
+import threading
+import time
+import urllib2
+
+
+class Command(BaseCommand):
+    help = 'Requests the index, list, feed and most viewed detail pages so the ' \
+           'job counts, feeds, latest jobs and job rows are cached before the ' \
+           'visitors come, e.g. right after a deploy. Use --base-url to also ' \
+           'warm the memory of the running workers (snapshot, city grid, ' \
+           'markup converters), otherwise the pages are rendered in process.'
+
+    option_list = BaseCommand.option_list + (
+        make_option('--base-url', dest='base_url', default=None,
+                    help='Fetch the pages from the running site, e.g. http://localhost:8000'),
+        make_option('--concurrency', dest='concurrency', type='int', default=4,
+                    help='Number of pages requested at once.'),
+        make_option('--details', dest='details', type='int', default=50,
+                    help='Number of job detail pages, the most viewed in the last week.'),
+        make_option('--timeout', dest='timeout', type='int', default=30,
+                    help='Seconds to wait for a page with --base-url.'),
+    )
+
+    def get_urls(self, details):
+        ''' Returns (group, path) tuples of the pages to warm, read from the
+            database the same way the pages themselves read it.
+        '''
+        urls = [('index', reverse('listings_job_list')),
+                ('index', reverse('listings_job_list_all')),
+                ('index', reverse('listings_cities_list')),
+                ('index', reverse('listings_companies')),
+                ('feed', reverse('listings_feed', args=['all']))]
+        category_ids = get_job_counts('category').keys()
+        for slug in Category.objects.filter(pk__in=category_ids).values_list('slug', flat=True):
+            urls.append(('category', reverse('listings_job_list_category', args=[slug])))
+            urls.append(('feed', reverse('listings_feed', args=[slug])))
+        city_ids = [pk for pk in get_job_counts('city').keys() if pk]
+        for name in City.objects.filter(pk__in=city_ids).values_list('ascii_name', flat=True):
+            urls.append(('city', reverse('listings_jobs_in_city', args=[name])))
+        for slug in Job.active.values_list('company_slug', flat=True).distinct():
+            urls.append(('company', reverse('listings_jobs_at', args=[slug])))
+        if details:
+            viewed = JobStat.objects.filter(stat_type=JobStat.HIT, created_on__gte=datetime.now() - timedelta(days=7),
+                                            job__in=Job.active.all()) \
+                                    .values('job').annotate(hits=Count('pk')).order_by('-hits')[:details]
+            job_ids = [row['job'] for row in viewed]
+            if len(job_ids) < details:
+                # not enough stats yet, fill with the newest jobs
+                job_ids.extend(Job.active.exclude(pk__in=job_ids).order_by('-created_on')
+                               .values_list('pk', flat=True)[:details - len(job_ids)])
+            for pk, ad_url in Job.objects.filter(pk__in=job_ids).values_list('pk', 'ad_url'):
+                urls.append(('detail', reverse('listings_ad_detail', kwargs={'pk': pk, 'ad_url': ad_url})))
+        return urls
+
+    def get_response(self, local, path, host):
+        ''' Renders the page in process like the WSGI handler would, with a
+            handler per thread; the test client shares its state between
+            threads.
+        '''
+        if not hasattr(local, 'handler'):
+            local.handler = BaseHandler()
+            local.handler.load_middleware()
+            local.factory = RequestFactory()
+        signals.request_started.send(sender=self.__class__)
+        try:
+            return local.handler.get_response(local.factory.get(path, HTTP_HOST=host))
+        finally:
+            # closes the database connection of the thread
+            signals.request_finished.send(sender=self.__class__)
+
+    def handle(self, *args, **options):
+        if options['concurrency'] < 1:
+            raise CommandError('--concurrency must be a positive number.')
+        base_url = options['base_url'] and options['base_url'].rstrip('/')
+        timeout = options['timeout']
+        started = time.time()
+
+        # the version keys and the job counts tables come first, every page needs them
+        for name in ('top_jobs', 'sitemaps', 'feed:all'):
+            get_version(name)
+        get_job_counts('all')
+        urls = self.get_urls(options['details'])
+
+        local = threading.local()
+        host = Site.objects.get_current().domain
+
+        def fetch(url):
+            group, path = url
+            start = time.time()
+            try:
+                if base_url:
+                    response = urllib2.urlopen(base_url + path, timeout=timeout)
+                    status, size = response.getcode(), len(response.read())
+                else:
+                    response = self.get_response(local, path, host)
+                    status, size = response.status_code, len(response.content)
+            except urllib2.HTTPError as e:
+                status, size = e.code, 0
+            except Exception as e:
+                status, size = repr(e), 0
+            return group, path, status, size, time.time() - start
+
+        pool = ThreadPool(options['concurrency'])
+        try:
+            results = list(pool.imap_unordered(fetch, urls))
+        finally:
+            pool.close()
+            pool.join()
+
+        groups = {}
+        failed = []
+        for group, path, status, size, seconds in results:
+            count, total, slowest = groups.get(group, (0, 0.0, 0.0))
+            groups[group] = (count + 1, total + seconds, max(slowest, seconds))
+            if status != 200:
+                failed.append((path, status))
+
+        self.stdout.write('%-10s %6s %10s %10s\n' % ('pages', 'count', 'avg ms', 'max ms'))
+        for group in sorted(groups):
+            count, total, slowest = groups[group]
+            self.stdout.write('%-10s %6d %10.1f %10.1f\n' % (group, count, total * 1000 / count, slowest * 1000))
+        for path, status in failed:
+            self.stdout.write('Failed: %s (%s)\n' % (path, status))
+        self.stdout.write('Warmed %d page(s), %d failed, in %.1fs with %d thread(s)\n' %
+                          (len(results) - len(failed), len(failed), time.time() - started,
+                           options['concurrency']))
@@ -1,2 +1,7 @@
 from listings.models.job_models import *
 from listings.models.base_models import POSTING_ACTIVE, POSTING_INACTIVE, POSTING_TEMPORARY
+from listings.models.index_models import *
+from listings.models.dedupe_models import *
+
+# connect the receivers keeping the listing indexes up to date
+import listings.receivers
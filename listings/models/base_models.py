@@ -1,8 +1,10 @@
 from django.db import models
 from django.utils.translation import ugettext_lazy as _
-from django.contrib.sites.managers import CurrentSiteManager
 from django.contrib.sites.models import Site
 from django.contrib.auth.models import User
+from django.conf import settings as django_settings
+
+from listings.conf import settings as listings_settings
 
 from datetime import datetime
 import uuid
@@ -23,16 +25,55 @@ POSTING_STATUS_CHOICES = (
 )
 
 
-class TemporaryPostingsManager(CurrentSiteManager):
+class SitePostingsManager(models.Manager):
+    ''' The postings of the current site, of the given status if any.
+        With LISTINGS_SITE_INDEX on they are filtered through the SiteListing
+        table instead of the sites M2M table, which is still a join; count()
+        and listed_ids() are served from SiteListing alone.
+    '''
+    status = None
+
     def get_query_set(self):
-        return super(TemporaryPostingsManager, self).get_query_set() \
-            .filter(status=POSTING_TEMPORARY)
+        if listings_settings.LISTINGS_SITE_INDEX:
+            lookup = {'site_listings__site__id__exact': django_settings.SITE_ID}
+            if self.status is not None:
+                lookup['site_listings__status'] = self.status
+        else:
+            lookup = {'sites__id__exact': django_settings.SITE_ID}
+            if self.status is not None:
+                lookup['status'] = self.status
+        return super(SitePostingsManager, self).get_query_set().filter(**lookup)
 
+    def site_listings(self):
+        ''' The SiteListing rows of the postings of this manager.
+        '''
+        site_listing = self.model.site_listings.related.model
+        listings = site_listing.objects.filter(site__id__exact=django_settings.SITE_ID)
+        if self.status is not None:
+            listings = listings.filter(status=self.status)
+        return listings
+
+    def listed_ids(self, **filters):
+        ''' The ids of the postings matching the category_id, jobtype_id
+            or city_id filters, newest first, selected and sorted on the
+            SiteListing columns only.
+        '''
+        return self.site_listings().filter(**filters).order_by('-created_on', '-job') \
+                                   .values_list('job', flat=True)
+
+    def count(self):
+        # counting doesn't need the postings table at all
+        if listings_settings.LISTINGS_SITE_INDEX:
+            return self.site_listings().count()
+        return super(SitePostingsManager, self).count()
 
-class ActivePostingsManager(CurrentSiteManager):
-    def get_query_set(self):
-        return super(ActivePostingsManager, self).get_query_set() \
-            .filter(status=POSTING_ACTIVE)
+
+class TemporaryPostingsManager(SitePostingsManager):
+    status = POSTING_TEMPORARY
+
+
+class ActivePostingsManager(SitePostingsManager):
+    status = POSTING_ACTIVE
 
 
 class Posting(models.Model):
@@ -51,24 +92,42 @@ class Posting(models.Model):
     city = models.ForeignKey('cities_light.City', verbose_name=_('City'), null=True, blank=True)
     outside_location = models.CharField(_('Outside location'), max_length=150, blank=True)
 
-    created_on = models.DateTimeField(_('Created on'), editable=False, default=datetime.now())
-    status = models.IntegerField(choices=POSTING_STATUS_CHOICES, default=POSTING_TEMPORARY)
+    created_on = models.DateTimeField(_('Created on'), editable=False, default=datetime.now(), db_index=True)
+    status = models.IntegerField(choices=POSTING_STATUS_CHOICES, default=POSTING_TEMPORARY, db_index=True)
     views_count = models.IntegerField(editable=False, default=0)
     auth = models.CharField(blank=True, editable=False, max_length=32)
     admin_auth = models.CharField(blank=True, editable=False, max_length=32)
 
     poster_email = models.EmailField(_('Poster email'), blank=False)
-    featured = models.BooleanField(_('Spotlight'), default=False)
+    featured = models.BooleanField(_('Spotlight'), default=False, db_index=True)
     objects = models.Manager()
 
-    on_site = CurrentSiteManager()
+    on_site = SitePostingsManager()
     active = ActivePostingsManager()
     temporary = TemporaryPostingsManager()
     sites = models.ManyToManyField(Site)
 
+    # fields whose changes are reported by the job_saved signal
+    tracked_fields = ('status', 'featured', 'created_on')
+
+    def __init__(self, *args, **kwargs):
+        super(Posting, self).__init__(*args, **kwargs)
+        self._remember_state()
+
     def __unicode__(self):
         return self.title
 
+    def _remember_state(self):
+        # read __dict__ so deferred fields are not loaded
+        self._saved_state = dict((f, self.__dict__.get(f)) for f in self.tracked_fields)
+
+    def get_changed_fields(self):
+        ''' Returns the tracked fields changed since the posting was loaded
+            or last saved.
+        '''
+        return set(f for f in self.tracked_fields
+                   if self.__dict__.get(f) != self._saved_state[f])
+
     def get_sites(self):
         return ', '.join([site.name for site in self.sites.all()])
     get_sites.allow_tags = True
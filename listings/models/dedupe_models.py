@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+
+from django.db import models
+from django.utils.translation import ugettext_lazy as _
+
+from listings.models.base_models import POSTING_ACTIVE
+from listings.models.job_models import Job
+from listings.conf import settings as listings_settings
+from listings import dedupe
+
+import datetime
+
+
+class JobSignature(models.Model):
+    ''' The MinHash signature of a job title and description, see
+        listings.dedupe.
+    '''
+    job = models.OneToOneField(Job, primary_key=True, related_name='signature')
+    minhash = models.TextField()
+
+    class Meta:
+        app_label = 'listings'
+
+    def __unicode__(self):
+        return unicode(self.job_id)
+
+    def get_minhash(self):
+        return [int(h) for h in self.minhash.split(',')]
+
+
+class JobSignatureBand(models.Model):
+    ''' One row per band of a job signature, the index the near-duplicates
+        of a job are looked up in.
+    '''
+    job = models.ForeignKey(Job, related_name='signature_bands')
+    key = models.BigIntegerField(db_index=True)
+
+    class Meta:
+        app_label = 'listings'
+
+    def __unicode__(self):
+        return u'%s: %s' % (self.job_id, self.key)
+
+
+class DuplicateJob(models.Model):
+    ''' A job found to be nearly the same as an active job of the same
+        poster, for the admins to review.
+    '''
+    job = models.ForeignKey(Job, related_name='duplicate_of')
+    original = models.ForeignKey(Job, related_name='duplicates')
+    similarity = models.FloatField()
+    created_on = models.DateTimeField(default=datetime.datetime.now)
+
+    class Meta:
+        app_label = 'listings'
+        ordering = ('-created_on',)
+        verbose_name = _('Duplicate job')
+        verbose_name_plural = _('Duplicate jobs')
+
+    def __unicode__(self):
+        return u'%s ~ %s' % (self.job_id, self.original_id)
+
+
+def save_job_signature(job_id, signature):
+    ''' Stores the signature of a job and its bands, replacing the former.
+        The transaction is left to the caller.
+    '''
+    JobSignature.objects.filter(job=job_id).delete()
+    JobSignatureBand.objects.filter(job=job_id).delete()
+    JobSignature.objects.create(job_id=job_id, minhash=','.join(str(h) for h in signature))
+    JobSignatureBand.objects.bulk_create([JobSignatureBand(job_id=job_id, key=key)
+                                          for key in dedupe.band_keys(signature)])
+
+
+def find_duplicates(signature, poster_email, exclude=None):
+    ''' Returns a list of (job id, similarity) tuples of the active jobs of
+        the poster whose signature is at least LISTINGS_DEDUPE_THRESHOLD
+        similar, the most similar first. Only the jobs sharing a band with
+        the signature are compared.
+    '''
+    candidates = JobSignatureBand.objects.filter(key__in=dedupe.band_keys(signature),
+                                                 job__poster_email=poster_email,
+                                                 job__status=POSTING_ACTIVE)
+    if exclude is not None:
+        candidates = candidates.exclude(job=exclude)
+    job_ids = set(candidates.values_list('job', flat=True))
+    if not job_ids:
+        return []
+    duplicates = []
+    for candidate in JobSignature.objects.filter(job__in=job_ids):
+        score = dedupe.similarity(signature, candidate.get_minhash())
+        if score >= listings_settings.LISTINGS_DEDUPE_THRESHOLD:
+            duplicates.append((candidate.job_id, score))
+    duplicates.sort(key=lambda d: -d[1])
+    return duplicates
+
+
+def flag_duplicates(job, signature):
+    ''' Records the active job of the same poster the job is most similar
+        to, if any, and returns its id.
+    '''
+    DuplicateJob.objects.filter(job=job).delete()
+    duplicates = find_duplicates(signature, job.poster_email, exclude=job.pk)
+    if not duplicates:
+        return None
+    original_id, score = duplicates[0]
+    DuplicateJob.objects.create(job=job, original_id=original_id, similarity=score)
+    return original_id
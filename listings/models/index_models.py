@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+
+from django.db import models, router, transaction, IntegrityError
+from django.contrib.sites.models import Site
+from django.conf import settings as django_settings
+
+from listings.models.base_models import POSTING_STATUS_CHOICES, POSTING_ACTIVE
+from listings.models.job_models import Job
+
+
+class SiteListing(models.Model):
+    ''' One row per job and site, with the columns the listing pages filter
+        and sort on, so they don't need to join the sites M2M table. It is
+        kept up to date by listings.receivers.
+    '''
+    site = models.ForeignKey(Site)
+    job = models.ForeignKey(Job, related_name='site_listings')
+    status = models.IntegerField(choices=POSTING_STATUS_CHOICES, db_index=True)
+    created_on = models.DateTimeField(db_index=True)
+    category_id = models.IntegerField(null=True, db_index=True)
+    jobtype_id = models.IntegerField(null=True, db_index=True)
+    city_id = models.IntegerField(null=True, db_index=True)
+
+    class Meta:
+        app_label = 'listings'
+        unique_together = (('site', 'job'),)
+
+    def __unicode__(self):
+        return u'%s@%s' % (self.job_id, self.site_id)
+
+
+def _create_or_update(model, lookup, values, update=None):
+    # a concurrent save may insert the same row first, the savepoint keeps
+    # the caller's transaction usable when it does
+    using = router.db_for_write(model)
+    sid = transaction.savepoint(using=using)
+    try:
+        model.objects.create(**dict(lookup, **values))
+    except IntegrityError:
+        transaction.savepoint_rollback(sid, using=using)
+        model.objects.filter(**lookup).update(**(update or values))
+    else:
+        transaction.savepoint_commit(sid, using=using)
+
+
+def sync_site_listings(job_ids):
+    ''' Updates the SiteListing rows of the given jobs from the job and
+        sites tables, in place so concurrent saves of a job don't conflict.
+        The transaction is left to the caller.
+    '''
+    job_ids = list(job_ids)
+    if not job_ids:
+        return
+    jobs = dict((row[0], row[1:]) for row in Job.objects.filter(pk__in=job_ids)
+                .values_list('pk', 'status', 'created_on', 'category', 'jobtype', 'city'))
+    wanted = {}
+    for job_id, site_id in Job.sites.through.objects.filter(job__in=job_ids).values_list('job', 'site'):
+        status, created_on, category_id, jobtype_id, city_id = jobs[job_id]
+        wanted[job_id, site_id] = (status, created_on, category_id, jobtype_id, city_id)
+    existing = dict(((row[0], row[1]), row[2:]) for row in SiteListing.objects.filter(job__in=job_ids)
+                    .values_list('job', 'site', 'status', 'created_on', 'category_id', 'jobtype_id', 'city_id'))
+
+    gone = [key for key in existing if key not in wanted]
+    for job_id in set(job_id for job_id, site_id in gone):
+        SiteListing.objects.filter(job=job_id, site__in=[s for j, s in gone if j == job_id]).delete()
+    missing = []
+    for (job_id, site_id), row in wanted.items():
+        if existing.get((job_id, site_id)) == row:
+            continue
+        values = dict(zip(('status', 'created_on', 'category_id', 'jobtype_id', 'city_id'), row))
+        lookup = {'job_id': job_id, 'site_id': site_id}
+        if (job_id, site_id) in existing:
+            SiteListing.objects.filter(**lookup).update(**values)
+        else:
+            missing.append((lookup, values))
+    if not missing:
+        return
+    # one insert for the whole batch, row by row if another save raced it
+    using = router.db_for_write(SiteListing)
+    sid = transaction.savepoint(using=using)
+    try:
+        SiteListing.objects.bulk_create([SiteListing(**dict(lookup, **values)) for lookup, values in missing])
+    except IntegrityError:
+        transaction.savepoint_rollback(sid, using=using)
+        for lookup, values in missing:
+            _create_or_update(SiteListing, lookup, values)
+    else:
+        transaction.savepoint_commit(sid, using=using)
+
+
+class JobCount(models.Model):
+    ''' The number of active jobs of a site by category, job type or city,
+        key 0 standing for the jobs without one (e.g. in other cities). The
+        'all' dimension holds the site total under key 0. It is kept up
+        to date by listings.receivers.
+    '''
+    DIMENSIONS = ('all', 'category', 'jobtype', 'city')
+
+    site = models.ForeignKey(Site)
+    dimension = models.CharField(max_length=16)
+    key = models.IntegerField()
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        app_label = 'listings'
+        unique_together = (('site', 'dimension', 'key'),)
+
+    def __unicode__(self):
+        return u'%s %s=%s: %d' % (self.site_id, self.dimension, self.key, self.count)
+
+
+def refresh_job_counts(keys=None):
+    ''' Recounts the active jobs of every site for the given keys, a dict
+        of sets of ids (None for the jobs without a value) by dimension.
+        Every dimension is recounted when no keys are given. The rows are
+        updated in place and the transaction is left to the caller.
+    '''
+    if keys is None:
+        keys = dict((dimension, None) for dimension in JobCount.DIMENSIONS)
+    counts = {}
+    current = []
+    for dimension, ids in keys.items():
+        active = Job.objects.filter(status=POSTING_ACTIVE)
+        stored = JobCount.objects.filter(dimension=dimension)
+        if dimension == 'all':
+            rows = active.values_list('sites').annotate(models.Count('pk'))
+            rows = [(site_id, None, count) for site_id, count in rows]
+            # the total is stored even when 0, it tells the counts exist
+            for site_id in Site.objects.exclude(pk__in=[r[0] for r in rows]).values_list('pk', flat=True):
+                rows.append((site_id, None, 0))
+        else:
+            if ids is not None:
+                ids = set(ids)
+                lookup = None
+                if ids - set([None, 0]):
+                    lookup = models.Q(**{'%s__in' % dimension: list(ids - set([None, 0]))})
+                if None in ids or 0 in ids:
+                    no_value = models.Q(**{'%s__isnull' % dimension: True})
+                    if lookup is None:
+                        lookup = no_value
+                    else:
+                        lookup = lookup | no_value
+                if lookup is None:
+                    continue
+                active = active.filter(lookup)
+                stored = stored.filter(key__in=[i or 0 for i in ids])
+            rows = active.values_list('sites', dimension).annotate(models.Count('pk'))
+        current.extend(stored.values_list('site', 'dimension', 'key', 'count'))
+        counts.update(((site_id, dimension, key or 0), count)
+                      for site_id, key, count in rows if site_id is not None)
+
+    existing = dict(((site_id, dimension, key), count) for site_id, dimension, key, count in current)
+    for key in existing:
+        # the keys without active jobs left drop to 0
+        counts.setdefault(key, 0)
+    for (site_id, dimension, key), count in counts.items():
+        lookup = {'site_id': site_id, 'dimension': dimension, 'key': key}
+        if (site_id, dimension, key) in existing:
+            if existing[site_id, dimension, key] != count:
+                JobCount.objects.filter(**lookup).update(count=count)
+        elif count or dimension == 'all':
+            _create_or_update(JobCount, lookup, {'count': count})
+
+
+def adjust_job_counts(site_ids, deltas):
+    ''' Adds the {(dimension, key): delta} deltas to the counts of the given
+        sites, key 0 standing for no value. The rows are incremented in
+        place, so concurrent saves don't conflict nor recount the sites.
+        Sites whose counts were never built are left to get_job_counts.
+    '''
+    for site_id in site_ids:
+        counts = JobCount.objects.filter(site__id=site_id)
+        if not counts.filter(dimension='all').exists():
+            continue
+        for (dimension, key), delta in deltas.items():
+            if not delta:
+                continue
+            increment = {'count': models.F('count') + delta}
+            if not counts.filter(dimension=dimension, key=key).update(**increment) and delta > 0:
+                # no row means no active job had that value yet
+                _create_or_update(JobCount, {'site_id': site_id, 'dimension': dimension, 'key': key},
+                                  {'count': delta}, increment)
+
+
+def get_job_counts(dimension, site_id=None):
+    ''' Returns a {key: count} dict of the active jobs of a site, the
+        current one by default, for the given dimension.
+    '''
+    if site_id is None:
+        site_id = django_settings.SITE_ID
+    counts = JobCount.objects.filter(site__id=site_id, dimension__in=('all', dimension)) \
+                             .values_list('dimension', 'key', 'count')
+    rows = list(counts)
+    if not rows:
+        # the counts were never built, e.g. right after an upgrade
+        refresh_job_counts()
+        rows = list(counts._clone())
+    # the keys whose last active job went away are kept at 0
+    return dict((key, count) for d, key, count in rows if d == dimension and (count or d == 'all'))
+
+
+class SimilarJob(models.Model):
+    ''' The active jobs most similar to a job, best first, as computed by
+        the update_similar_jobs command.
+    '''
+    job = models.ForeignKey(Job, related_name='similar_jobs')
+    similar = models.ForeignKey(Job, related_name='+')
+    score = models.FloatField()
+    rank = models.SmallIntegerField()
+
+    class Meta:
+        app_label = 'listings'
+        ordering = ('rank',)
+        unique_together = (('job', 'rank'),)
+
+    def __unicode__(self):
+        return u'%s ~ %s: %.3f' % (self.job_id, self.similar_id, self.score)
+
+
+class PendingSimilarJob(models.Model):
+    ''' A job activated, deactivated or edited since the similar jobs were
+        last computed.
+    '''
+    job = models.OneToOneField(Job, primary_key=True, related_name='+')
+
+    class Meta:
+        app_label = 'listings'
+
+
+def mark_similar_jobs_pending(job_ids):
+    job_ids = set(job_ids)
+    if not job_ids:
+        return
+    job_ids -= set(PendingSimilarJob.objects.filter(job__in=job_ids).values_list('job', flat=True))
+    PendingSimilarJob.objects.bulk_create([PendingSimilarJob(job_id=pk) for pk in job_ids])
+
+
+def get_similar_jobs(job):
+    ''' Returns the stored similar jobs of a job that are still active.
+    '''
+    rows = SimilarJob.objects.filter(job=job, similar__status=POSTING_ACTIVE).select_related('similar')
+    return [row.similar for row in rows]
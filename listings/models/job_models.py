@@ -3,18 +3,17 @@
 from django.db import models
 from django.template.defaultfilters import slugify
 from django.core.exceptions import ValidationError
-from django.utils.safestring import mark_safe
-from django.utils.encoding import smart_str, force_unicode
 from django.utils.translation import ugettext_lazy as _
-from django.utils.html import strip_tags
 from django import VERSION as django_version
 from django.contrib.sites.models import Site
 from django.contrib.sites.managers import CurrentSiteManager
 from django.conf import settings as django_settings
 
-from listings.helpers import last_hour, getIP, strip_disallowed_tags
+from listings.helpers import last_hour, getIP, render_description
 from listings.models.base_models import Posting
 from listings.conf import settings as listings_settings
+from listings.signals import job_saved, jobs_updated
+from listings import blocklist
 
 import datetime
 import random
@@ -64,6 +63,9 @@ class Job(Posting):
     #url of the job post
     ad_url = models.CharField(blank=True, editable=False, max_length=32)
 
+    tracked_fields = Posting.tracked_fields + ('category_id', 'jobtype_id', 'city_id',
+                                               'title', 'company', 'description_text', 'poster_email')
+
     apply_online = models.BooleanField(default=True, verbose_name=_('Allow online applications.'), help_text=_('If you are unchecking this, then add a description on how to apply online!'))
 
     class Meta:
@@ -109,40 +111,34 @@ class Job(Posting):
                 location = '-' + slugify(self.get_location())
             self.ad_url = slugify(self.title) + location + '-' + ''.join(random.choice('gqwcz') for x in range(2))
 
-        self.description_text = strip_tags(self.description)
-
-        # when saving with textile
-        if listings_settings.LISTINGS_MARKUP_LANGUAGE == 'textile':
-            import textile
-            self.description = mark_safe(
-                force_unicode(
-                    textile.textile(
-                        smart_str(self.description))))
-        # or markdown
-        elif listings_settings.LISTINGS_MARKUP_LANGUAGE == 'markdown':
-            import markdown
-            self.description = mark_safe(
-                force_unicode(
-                    markdown.markdown(
-                        smart_str(self.description))))
-
-        # or wysiwyg
-        elif listings_settings.LISTINGS_MARKUP_LANGUAGE == 'html':
-            import django_wysiwyg
-            self.description = mark_safe(
-                force_unicode(
-                    django_wysiwyg.clean_html(self.description)))
-
-        # or else, disallow all markup
-        else:
-            self.description = self.description_text
-
-        self.description = strip_disallowed_tags(self.description)
+        self.description, self.description_text = render_description(self.description)
 
+        created = self.pk is None
+        changed = self.get_changed_fields()
         super(Job, self).save(*args, **kwargs)
-        current_site = Site.objects.get(pk=django_settings.SITE_ID)
-        if current_site not in self.sites.all():
-            self.sites.add(current_site)
+        # the receivers see the sites the job was on, a new site is handled
+        # by the m2m_changed receivers
+        job_saved.send(sender=Job, job=self, created=created, changed=changed)
+        # add() skips the sites the job is already on
+        self.sites.add(django_settings.SITE_ID)
+        self._remember_state()
+
+
+UPDATE_CHUNK_SIZE = 500  # below the 999 variables SQLite allows per statement
+
+
+def update_jobs(queryset, chunk_size=UPDATE_CHUNK_SIZE, **values):
+    ''' Like queryset.update(**values) but also sends the jobs_updated
+        signal, so the listing indexes learn about the change. The jobs
+        are updated and signalled chunk_size at a time, by pk.
+    '''
+    pks = list(queryset.order_by('pk').values_list('pk', flat=True))
+    count = 0
+    for i in range(0, len(pks), chunk_size):
+        chunk = pks[i:i + chunk_size]
+        count += Job.objects.filter(pk__in=chunk).update(**values)
+        jobs_updated.send(sender=Job, pks=chunk, fields=values.keys())
+    return count
 
 
 class JobStat(models.Model):
@@ -159,7 +155,7 @@ class JobStat(models.Model):
     else:
         job = models.ForeignKey(Job)
     created_on = models.DateTimeField(default=datetime.datetime.now())
-    ip = models.IPAddressField()
+    ip = models.IPAddressField(db_index=True)
     stat_type = models.CharField(max_length=1, choices=STAT_TYPES)
     description = models.CharField(_('Description'), max_length=250)
     sites = models.ManyToManyField(Site)
@@ -180,6 +176,94 @@ class JobStat(models.Model):
         super(JobStat, self).save(*args, **kwargs)
 
 
+class ArchivedJob(models.Model):
+    ''' What's left of an old inactive job once it's moved out of the job
+        table, just enough to tell visitors of its url it's unavailable.
+    '''
+    id = models.IntegerField(primary_key=True)
+    ad_url = models.CharField(max_length=32)
+    title = models.CharField(_('Title'), max_length=100)
+    company = models.CharField(_('Company'), max_length=150)
+    company_slug = models.SlugField(max_length=150)
+    category_id = models.IntegerField(null=True, blank=True)
+    created_on = models.DateTimeField(_('Created on'))
+    archived_on = models.DateTimeField(_('Archived on'), default=datetime.datetime.now)
+
+    class Meta:
+        app_label = 'listings'
+        verbose_name = _('Archived job')
+        verbose_name_plural = _('Archived jobs')
+
+    def __unicode__(self):
+        return self.title
+
+
+class AdminNotification(models.Model):
+    ''' A job confirmation the admins haven't been told about yet, it's
+        mailed in the next digest when LISTINGS_ADMIN_DIGEST_INTERVAL is set.
+    '''
+    job = models.ForeignKey(Job)
+    new_post = models.BooleanField(default=False)
+    ip = models.IPAddressField()
+    created_on = models.DateTimeField(default=datetime.datetime.now)
+
+    class Meta:
+        app_label = 'listings'
+        ordering = ('created_on',)
+        verbose_name = _('Admin notification')
+        verbose_name_plural = _('Admin notifications')
+
+    def __unicode__(self):
+        return unicode(self.job)
+
+
+class BlockedIP(models.Model):
+    ''' An address or a CIDR network the BlocklistMiddleware refuses
+        requests from.
+    '''
+    network = models.CharField(_('Address or network'), max_length=43, unique=True,
+                               help_text=_('e.g. 192.0.2.1 or 192.0.2.0/24'))
+    reason = models.CharField(_('Reason'), max_length=250, blank=True)
+    created_on = models.DateTimeField(_('Created on'), default=datetime.datetime.now)
+
+    class Meta:
+        app_label = 'listings'
+        verbose_name = _('Blocked IP')
+        verbose_name_plural = _('Blocked IPs')
+
+    def __unicode__(self):
+        return self.network
+
+    def clean(self):
+        try:
+            blocklist.network_range(self.network)
+        except ValueError:
+            raise ValidationError(_('Enter a valid address or network.'))
+
+
+def get_blocked_networks():
+    ''' Returns the blocked networks and the addresses reported as spam at
+        least LISTINGS_BLOCKLIST_SPAM_THRESHOLD times in the last
+        LISTINGS_BLOCKLIST_SPAM_DAYS days.
+    '''
+    networks = list(BlockedIP.objects.values_list('network', flat=True))
+    since = datetime.datetime.now() - datetime.timedelta(days=listings_settings.LISTINGS_BLOCKLIST_SPAM_DAYS)
+    spammers = JobStat.objects.filter(stat_type=JobStat.SPAM, created_on__gte=since) \
+                              .values('ip').annotate(reports=models.Count('pk')) \
+                              .filter(reports__gte=listings_settings.LISTINGS_BLOCKLIST_SPAM_THRESHOLD)
+    networks.extend(row['ip'] for row in spammers)
+    return networks
+
+
+def build_blocklist():
+    ''' Compiles the blocklist into LISTINGS_BLOCKLIST_FILE, returns the
+        number of address ranges or None when there's no file to build.
+    '''
+    if not listings_settings.LISTINGS_BLOCKLIST_FILE:
+        return None
+    return blocklist.write_blocklist(get_blocked_networks(), listings_settings.LISTINGS_BLOCKLIST_FILE)
+
+
 class JobSearch(models.Model):
     keywords = models.CharField(_('Keywords'), max_length=100, blank=False)
     created_on = models.DateTimeField(_('Created on'), default=datetime.datetime.now())
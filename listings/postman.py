@@ -5,97 +5,156 @@ from django.core.mail import EmailMultiAlternatives
 from django.template.loader import get_template
 from django.template import Context
 from django.contrib.sites.models import Site
+from django.core.urlresolvers import reverse
 from listings.helpers import getIP, handle_uploaded_file, delete_uploaded_file
 from listings.conf import settings as listings_settings
 from time import time
 import threading
 
-site_domain = Site.objects.get_current().domain
+_mail_templates = {}
 
-class MailPublishToAdmin(threading.Thread):
 
-    def __init__(self, job, request):
-        threading.Thread.__init__(self)
-        plaintext = get_template('listings/emails/publish_to_admin.txt')
-        html = get_template('listings/emails/publish_to_admin.html')
-        template_vars = {}
-        template_vars['job_url'] = 'http://%s%s' % (site_domain, job.get_absolute_url())
-        template_vars['job_title'] = job.title
-        template_vars['job_company'] = job.company
-        template_vars['job_description'] = job.description
-        template_vars['job_poster_email'] = job.poster_email
-        job_info = {
-                    'site_name': listings_settings.LISTINGS_SITE_NAME,
-                    'job_title': job.title,
-        }
-        subject = listings_settings.LISTINGS_EDIT_POST_ADMIN_SUBJECT % job_info
-        if not job.is_active():
-            subject = listings_settings.LISTINGS_NEW_POST_ADMIN_SUBJECT % job_info
-            template_vars['job_activate_url'] = 'http://%s%s' % (site_domain, job.get_activation_url())
-        template_vars['job_edit_url'] = 'http://%s%s' % (site_domain, job.get_edit_url())
-        template_vars['job_deactivate_url'] = 'http://%s%s' % (site_domain, job.get_deactivation_url())
-        template_vars['job_poster_ip'] = getIP(request)
-        template_vars['job_post_date'] = job.created_on
-        d = Context(template_vars)
+def get_site_domain():
+    ''' Returns the current site domain. It's looked up when a mail is
+        built rather than at import time, so importing this module does
+        not touch the database.
+    '''
+    return Site.objects.get_current().domain
 
-        from_email = listings_settings.LISTINGS_ADMIN_EMAIL
-        to = listings_settings.LISTINGS_ADMIN_EMAIL
-        text_content = plaintext.render(d)
-        html_content = html.render(d)
-        self.email = EmailMultiAlternatives(subject, text_content, from_email, [to])
-        self.email.attach_alternative(html_content, "text/html")
 
-    def run(self):
-        self.email.send()
+def get_mail_templates(name):
+    ''' Returns the compiled (plaintext, html) templates of the given
+        mail, they are loaded once per process.
+    '''
+    if name not in _mail_templates:
+        _mail_templates[name] = (get_template('listings/emails/%s.txt' % name),
+                                 get_template('listings/emails/%s.html' % name))
+    return _mail_templates[name]
 
-class MailPublishPendingToUser(threading.Thread):
 
-    def __init__(self, job, request):
-        threading.Thread.__init__(self)
-        plaintext = get_template('listings/emails/publish_pending_to_user.txt')
-        html = get_template('listings/emails/publish_pending_to_user.html')
-        template_vars = {}
-        template_vars['job_url'] = 'http://%s%s' % (site_domain, job.get_absolute_url())
-        template_vars['job_title'] = job.title
-        template_vars['job_company'] = job.company
-        template_vars['job_description'] = job.description
-        template_vars['job_poster_email'] = job.poster_email
-        template_vars['job_post_date'] = job.created_on
-        d = Context(template_vars)
-        job_info = {
-                    'site_name': listings_settings.LISTINGS_SITE_NAME,
-                    'job_title': job.title,
+class JobMailContext(object):
+    ''' The urls and template variables of a job. They're computed once
+        per job event and shared by every mail sent because of it.
+    '''
+
+    def __init__(self, job, request=None):
+        site_domain = get_site_domain()
+        self.job = job
+        self.template_vars = {
+            'site_name': listings_settings.LISTINGS_SITE_NAME,
+            'job_url': 'http://%s%s' % (site_domain, job.get_absolute_url()),
+            'job_edit_url': 'http://%s%s' % (site_domain, job.get_edit_url()),
+            'job_deactivate_url': 'http://%s%s' % (site_domain, job.get_deactivation_url()),
+            'job_title': job.title,
+            'job_company': job.company,
+            'job_description': job.description,
+            'job_poster_email': job.poster_email,
+            'job_post_date': job.created_on,
+        }
+        if request is not None:
+            self.template_vars['job_poster_ip'] = getIP(request)
+        # carries the admin auth, only the admin mails get it
+        self.job_activate_url = 'http://%s%s' % (site_domain, job.get_activation_url())
+        self.job_info = {
+            'site_name': listings_settings.LISTINGS_SITE_NAME,
+            'job_title': job.title,
         }
-        subject = listings_settings.LISTINGS_MAIL_PENDING_SUBJECT %  job_info
+
+
+class JobMail(threading.Thread):
+    ''' Base class of the mails about a job, rendered from the plaintext
+        and html templates named after `template_name`, with `subject`
+        formatted with the site name and job title.
+    '''
+    template_name = None
+    subject = None
+
+    def __init__(self, job, request, context=None):
+        threading.Thread.__init__(self)
+        if context is None:
+            context = JobMailContext(job, request)
+        plaintext, html = get_mail_templates(self.template_name)
+        d = Context(self.get_template_vars(job, context))
         from_email = listings_settings.LISTINGS_ADMIN_EMAIL
-        to = job.poster_email
-        text_content = plaintext.render(d)
-        html_content = html.render(d)
-        self.email = EmailMultiAlternatives(subject, text_content, from_email, [to])
-        self.email.attach_alternative(html_content, "text/html")
+        self.email = EmailMultiAlternatives(self.get_subject(job, context),
+                                            plaintext.render(d), from_email,
+                                            [self.get_recipient(job)])
+        self.email.attach_alternative(html.render(d), "text/html")
+
+    def get_template_vars(self, job, context):
+        return context.template_vars
+
+    def get_subject(self, job, context):
+        return self.subject % context.job_info
+
+    def get_recipient(self, job):
+        return job.poster_email
 
     def run(self):
         self.email.send()
 
-class MailPublishToUser(threading.Thread):
+class MailPublishToAdmin(JobMail):
+    template_name = 'publish_to_admin'
 
-    def __init__(self, job, request):
+    def get_template_vars(self, job, context):
+        template_vars = context.template_vars
+        if not job.is_active():
+            template_vars = dict(template_vars, job_activate_url=context.job_activate_url)
+        return template_vars
+
+    def get_subject(self, job, context):
+        if not job.is_active():
+            return listings_settings.LISTINGS_NEW_POST_ADMIN_SUBJECT % context.job_info
+        return listings_settings.LISTINGS_EDIT_POST_ADMIN_SUBJECT % context.job_info
+
+    def get_recipient(self, job):
+        return listings_settings.LISTINGS_ADMIN_EMAIL
+
+class MailAdminDigest(threading.Thread):
+    ''' A single mail to the admins listing every job of the given
+        AdminNotification list, with links to activate all the new jobs
+        and to edit all of them at once.
+    '''
+
+    def __init__(self, notifications):
         threading.Thread.__init__(self)
-        plaintext = get_template('listings/emails/publish_to_user.txt')
-        html = get_template('listings/emails/publish_to_user.html')
-        template_vars = {}
-        template_vars['job_url'] = 'http://%s%s' % (site_domain, job.get_absolute_url())
-        template_vars['job_edit_url'] = 'http://%s%s' % (site_domain, job.get_edit_url())
-        template_vars['job_deactivate_url'] = 'http://%s%s' % (site_domain, job.get_deactivation_url())
-        template_vars['site_name'] = listings_settings.LISTINGS_SITE_NAME
+        site_domain = get_site_domain()
+        plaintext, html = get_mail_templates('publish_to_admin_digest')
+
+        # a job confirmed several times is listed once
+        jobs = {}
+        for notification in notifications:
+            entry = jobs.setdefault(notification.job_id, {'job': notification.job, 'new_post': False})
+            entry['new_post'] = entry['new_post'] or notification.new_post
+            entry['job_poster_ip'] = notification.ip
+
+        entries = []
+        new_jobs = []
+        for entry in sorted(jobs.values(), key=lambda e: e['job'].created_on):
+            job = entry['job']
+            context = JobMailContext(job)
+            entry.update(context.template_vars)
+            if entry['new_post']:
+                entry['job_activate_url'] = context.job_activate_url
+                new_jobs.append(job)
+            entries.append(entry)
+
+        template_vars = {'jobs': entries}
+        if new_jobs:
+            template_vars['batch_activate_url'] = 'http://%s%s?jobs=%s' % (
+                site_domain, reverse('listings_ad_activate_batch'),
+                ','.join('%d-%s' % (job.pk, job.admin_auth) for job in new_jobs))
+        template_vars['batch_edit_url'] = 'http://%s%s?id__in=%s' % (
+            site_domain, reverse('admin:listings_job_changelist'),
+            ','.join(str(entry['job'].pk) for entry in entries))
         d = Context(template_vars)
-        job_info = {
-                    'site_name': listings_settings.LISTINGS_SITE_NAME,
-                    'job_title': job.title,
+
+        subject = listings_settings.LISTINGS_ADMIN_DIGEST_SUBJECT % {
+            'site_name': listings_settings.LISTINGS_SITE_NAME,
+            'count': len(entries),
         }
-        subject = listings_settings.LISTINGS_MAIL_PUBLISH_SUBJECT % job_info 
         from_email = listings_settings.LISTINGS_ADMIN_EMAIL
-        to = job.poster_email
+        to = listings_settings.LISTINGS_ADMIN_EMAIL
         text_content = plaintext.render(d)
         html_content = html.render(d)
         self.email = EmailMultiAlternatives(subject, text_content, from_email, [to])
@@ -104,6 +163,14 @@ class MailPublishToUser(threading.Thread):
     def run(self):
         self.email.send()
 
+class MailPublishPendingToUser(JobMail):
+    template_name = 'publish_pending_to_user'
+    subject = listings_settings.LISTINGS_MAIL_PENDING_SUBJECT
+
+class MailPublishToUser(JobMail):
+    template_name = 'publish_to_user'
+    subject = listings_settings.LISTINGS_MAIL_PUBLISH_SUBJECT
+
 class MailApplyOnline(threading.Thread):
 
     def __init__(self, job, request):
@@ -0,0 +1,328 @@
+# -*- coding: utf-8 -*-
+
+from django.db.models.signals import m2m_changed, post_delete, post_save, post_syncdb, pre_delete
+
+from listings.models import (Job, JobStat, BlockedIP, POSTING_ACTIVE, sync_site_listings,
+                             refresh_job_counts, adjust_job_counts,
+                             save_job_signature, flag_duplicates, build_blocklist,
+                             mark_similar_jobs_pending)
+from listings.signals import job_saved, jobs_updated
+from listings.cache import bump_version
+from listings.conf import settings as listings_settings
+from listings import dedupe
+from listings.snapshot import record_changes
+from listings import search
+
+from categories.models import Category
+
+import datetime
+
+SITE_LISTING_FIELDS = set(['status', 'created_on', 'category_id', 'jobtype_id', 'city_id',
+                           'category', 'jobtype', 'city'])
+JOB_COUNT_FIELDS = set(['status', 'category_id', 'jobtype_id', 'city_id'])
+JOB_COUNT_DIMENSIONS = ('category', 'jobtype', 'city')
+SIGNATURE_FIELDS = set(['title', 'description_text', 'poster_email'])
+SIMILAR_JOB_FIELDS = set(['title', 'description_text', 'category_id'])
+TOP_JOB_FIELDS = set(['status', 'featured', 'created_on'])
+
+
+def update_site_listings(sender, job, created, changed, **kwargs):
+    # new jobs are indexed when they're added to their site
+    if not created and changed & SITE_LISTING_FIELDS:
+        sync_site_listings([job.pk])
+
+
+def update_site_listings_in_bulk(sender, pks, fields, **kwargs):
+    if SITE_LISTING_FIELDS.intersection(fields):
+        sync_site_listings(pks)
+
+
+def update_site_listings_on_sites(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if action != 'post_clear' and not pk_set:
+        return
+    if reverse:
+        # a site's jobs changed, only known for additions and removals
+        sync_site_listings(pk_set or [])
+    else:
+        sync_site_listings([instance.pk])
+
+
+def _count_keys(rows):
+    keys = {'all': set([None])}
+    for dimension in JOB_COUNT_DIMENSIONS:
+        keys[dimension] = set()
+    for row in rows:
+        for dimension, key in zip(JOB_COUNT_DIMENSIONS, row):
+            keys[dimension].add(key)
+    return keys
+
+
+def _job_count_rows(job):
+    return [tuple(getattr(job, d + '_id') for d in JOB_COUNT_DIMENSIONS)]
+
+
+def _count_deltas(values, delta, deltas=None):
+    # values is a (category, jobtype, city) tuple, the total counts too
+    deltas = deltas if deltas is not None else {}
+    for key in [('all', 0)] + [(d, v or 0) for d, v in zip(JOB_COUNT_DIMENSIONS, values)]:
+        deltas[key] = deltas.get(key, 0) + delta
+    return deltas
+
+
+def _job_sites(job_id):
+    return Job.sites.through.objects.filter(job=job_id).values_list('site', flat=True)
+
+
+def update_job_counts(sender, job, created, changed, **kwargs):
+    # a new job has no sites yet, it's counted when they're added
+    if created or not changed & JOB_COUNT_FIELDS:
+        return
+    was_active = job._saved_state['status'] == POSTING_ACTIVE
+    if not was_active and not job.is_active():
+        return
+    deltas = {}
+    if was_active:
+        _count_deltas(tuple(job._saved_state[d + '_id'] for d in JOB_COUNT_DIMENSIONS), -1, deltas)
+    if job.is_active():
+        _count_deltas(_job_count_rows(job)[0], 1, deltas)
+    adjust_job_counts(_job_sites(job.pk), deltas)
+
+
+def update_job_counts_in_bulk(sender, pks, fields, **kwargs):
+    fields = set(fields)
+    if fields.intersection(JOB_COUNT_DIMENSIONS + ('category_id', 'jobtype_id', 'city_id')):
+        # the former values are unknown
+        refresh_job_counts()
+    elif 'status' in fields:
+        rows = Job.objects.filter(pk__in=pks).values_list(*JOB_COUNT_DIMENSIONS)
+        refresh_job_counts(_count_keys(rows))
+
+
+def update_job_counts_on_sites(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear':
+        # the jobs and sites being cleared are gone by post_clear
+        deltas = {}
+        if reverse:
+            rows = Job.objects.filter(sites=instance, status=POSTING_ACTIVE).values_list(*JOB_COUNT_DIMENSIONS)
+            for row in rows:
+                _count_deltas(row, -1, deltas)
+            site_ids = [instance.pk]
+        else:
+            if instance.is_active():
+                _count_deltas(_job_count_rows(instance)[0], -1, deltas)
+            site_ids = list(_job_sites(instance.pk))
+        instance._cleared_job_counts = (site_ids, deltas)
+        return
+    if action == 'post_clear':
+        site_ids, deltas = instance.__dict__.pop('_cleared_job_counts', ([], {}))
+        if deltas:
+            adjust_job_counts(site_ids, deltas)
+        return
+    if action not in ('post_add', 'post_remove') or not pk_set:
+        return
+    delta = action == 'post_add' and 1 or -1
+    if reverse:
+        rows = Job.objects.filter(pk__in=pk_set, status=POSTING_ACTIVE).values_list(*JOB_COUNT_DIMENSIONS)
+        deltas = {}
+        for row in rows:
+            _count_deltas(row, delta, deltas)
+        adjust_job_counts([instance.pk], deltas)
+    elif instance.is_active():
+        adjust_job_counts(pk_set, _count_deltas(_job_count_rows(instance)[0], delta))
+
+
+def update_job_counts_on_delete(sender, instance, **kwargs):
+    # sent before the delete, while the job still has its sites
+    if instance.is_active():
+        adjust_job_counts(_job_sites(instance.pk), _count_deltas(_job_count_rows(instance)[0], -1))
+
+
+def _bump_feeds(category_slugs):
+    for slug in set(category_slugs) | set(['all']):
+        bump_version('feed:%s' % slug)
+
+
+def invalidate_feeds(sender, job, created, changed, **kwargs):
+    # a job shows in the feeds while it's active
+    if job.is_active() or 'status' in changed:
+        category_ids = set([job.category_id, job._saved_state['category_id']])
+        _bump_feeds(Category.objects.filter(pk__in=category_ids).values_list('slug', flat=True))
+
+
+def invalidate_feeds_in_bulk(sender, pks, fields, **kwargs):
+    _bump_feeds(Job.objects.filter(pk__in=pks, category__isnull=False)
+                .values_list('category__slug', flat=True).distinct())
+
+
+def invalidate_feeds_on_delete(sender, instance, **kwargs):
+    if instance.is_active():
+        _bump_feeds(Category.objects.filter(pk=instance.category_id).values_list('slug', flat=True))
+
+
+def mark_sitemaps_changed(sender, **kwargs):
+    # generate_sitemaps --if-changed regenerates them on its next run
+    if listings_settings.LISTINGS_SITEMAP_PREGENERATE:
+        job = kwargs.get('job') or kwargs.get('instance')
+        if job is None or job.is_active() or 'status' in kwargs.get('changed', ()):
+            bump_version('sitemaps')
+
+
+def update_job_signature(sender, job, created, changed, **kwargs):
+    if listings_settings.LISTINGS_DEDUPE_POLICY and (created or changed & SIGNATURE_FIELDS):
+        text = dedupe.job_text(job.title, job.description_text)
+        computed = getattr(job, '_dedupe_signature', None)
+        # the form computed it when checking for duplicates
+        signature = computed and computed[0] == text and computed[1] or dedupe.minhash(text)
+        save_job_signature(job.pk, signature)
+        flag_duplicates(job, signature)
+
+
+def mark_similar_jobs(sender, job, created, changed, **kwargs):
+    if not listings_settings.LISTINGS_SIMILAR_JOBS:
+        return
+    if 'status' in changed or (job.is_active() and changed & SIMILAR_JOB_FIELDS):
+        mark_similar_jobs_pending([job.pk])
+
+
+def mark_similar_jobs_in_bulk(sender, pks, fields, **kwargs):
+    if listings_settings.LISTINGS_SIMILAR_JOBS and 'status' in fields:
+        mark_similar_jobs_pending(pks)
+
+
+def record_snapshot_changes(sender, job, created, changed, **kwargs):
+    if listings_settings.LISTINGS_SNAPSHOT and (job.is_active() or 'status' in changed):
+        record_changes([job.pk])
+
+
+def record_snapshot_changes_in_bulk(sender, pks, fields, **kwargs):
+    if listings_settings.LISTINGS_SNAPSHOT:
+        record_changes(pks)
+
+
+def record_snapshot_changes_on_sites(sender, instance, action, reverse, pk_set, **kwargs):
+    if not listings_settings.LISTINGS_SNAPSHOT or action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if reverse:
+        record_changes(pk_set or [])
+    elif instance.is_active():
+        record_changes([instance.pk])
+
+
+def record_snapshot_changes_on_delete(sender, instance, **kwargs):
+    if listings_settings.LISTINGS_SNAPSHOT and instance.is_active():
+        record_changes([instance.pk])
+
+
+def invalidate_top_jobs(sender, job, created, changed, **kwargs):
+    # the latest and featured jobs only list active jobs
+    if 'status' in changed or (job.is_active() and (created or changed & TOP_JOB_FIELDS)):
+        bump_version('top_jobs')
+
+
+def invalidate_top_jobs_in_bulk(sender, pks, fields, **kwargs):
+    if TOP_JOB_FIELDS.intersection(fields):
+        bump_version('top_jobs')
+
+
+def invalidate_top_jobs_on_sites(sender, instance, action, reverse, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear') and (reverse or instance.is_active()):
+        bump_version('top_jobs')
+
+
+def invalidate_top_jobs_on_delete(sender, instance, **kwargs):
+    if instance.is_active():
+        bump_version('top_jobs')
+
+
+def invalidate_job_rows(sender, job, created, changed, **kwargs):
+    # any field may show in the row, not only the tracked ones
+    if not created:
+        bump_version('job:%d' % job.pk)
+
+
+def invalidate_job_rows_in_bulk(sender, pks, fields, **kwargs):
+    for pk in pks:
+        bump_version('job:%d' % pk)
+
+
+def update_search_index(sender, job, created, changed, **kwargs):
+    if search.is_enabled() and ((created and job.is_active()) or changed & search.SEARCH_FIELDS):
+        search.index_jobs([job.pk])
+
+
+def update_search_index_in_bulk(sender, pks, fields, **kwargs):
+    if search.is_enabled() and search.SEARCH_FIELDS.intersection(fields):
+        search.index_jobs(pks)
+
+
+def update_search_index_on_delete(sender, instance, **kwargs):
+    # the tsvector column goes with the row, the FTS5 table keeps it
+    if search.is_enabled() and instance.is_active():
+        search.index_jobs([instance.pk])
+
+
+def create_search_index_on_syncdb(sender, app, db=None, **kwargs):
+    # sent once per installed app, with its models module as sender
+    if app.__name__ == 'listings.models' and search.is_enabled() and search.create_search_index(db):
+        search.index_jobs(using=db)
+
+
+def rebuild_blocklist(sender, **kwargs):
+    build_blocklist()
+
+
+def rebuild_blocklist_on_spam(sender, instance, created, **kwargs):
+    # only the report making the address cross the threshold changes the list
+    if not created or instance.stat_type != JobStat.SPAM or not listings_settings.LISTINGS_BLOCKLIST_FILE:
+        return
+    since = instance.created_on - datetime.timedelta(days=listings_settings.LISTINGS_BLOCKLIST_SPAM_DAYS)
+    reports = JobStat.objects.filter(stat_type=JobStat.SPAM, ip=instance.ip, created_on__gte=since).count()
+    if reports == listings_settings.LISTINGS_BLOCKLIST_SPAM_THRESHOLD:
+        build_blocklist()
+
+
+job_saved.connect(update_site_listings, sender=Job)
+jobs_updated.connect(update_site_listings_in_bulk, sender=Job)
+m2m_changed.connect(update_site_listings_on_sites, sender=Job.sites.through)
+
+job_saved.connect(update_job_counts, sender=Job)
+jobs_updated.connect(update_job_counts_in_bulk, sender=Job)
+m2m_changed.connect(update_job_counts_on_sites, sender=Job.sites.through)
+pre_delete.connect(update_job_counts_on_delete, sender=Job)
+
+job_saved.connect(invalidate_feeds, sender=Job)
+jobs_updated.connect(invalidate_feeds_in_bulk, sender=Job)
+post_delete.connect(invalidate_feeds_on_delete, sender=Job)
+
+job_saved.connect(mark_sitemaps_changed, sender=Job)
+jobs_updated.connect(mark_sitemaps_changed, sender=Job)
+post_delete.connect(mark_sitemaps_changed, sender=Job)
+
+job_saved.connect(update_job_signature, sender=Job)
+
+job_saved.connect(mark_similar_jobs, sender=Job)
+jobs_updated.connect(mark_similar_jobs_in_bulk, sender=Job)
+
+job_saved.connect(invalidate_top_jobs, sender=Job)
+jobs_updated.connect(invalidate_top_jobs_in_bulk, sender=Job)
+m2m_changed.connect(invalidate_top_jobs_on_sites, sender=Job.sites.through)
+post_delete.connect(invalidate_top_jobs_on_delete, sender=Job)
+
+job_saved.connect(invalidate_job_rows, sender=Job)
+jobs_updated.connect(invalidate_job_rows_in_bulk, sender=Job)
+
+job_saved.connect(record_snapshot_changes, sender=Job)
+jobs_updated.connect(record_snapshot_changes_in_bulk, sender=Job)
+m2m_changed.connect(record_snapshot_changes_on_sites, sender=Job.sites.through)
+post_delete.connect(record_snapshot_changes_on_delete, sender=Job)
+
+job_saved.connect(update_search_index, sender=Job)
+jobs_updated.connect(update_search_index_in_bulk, sender=Job)
+post_delete.connect(update_search_index_on_delete, sender=Job)
+post_syncdb.connect(create_search_index_on_syncdb)
+
+post_save.connect(rebuild_blocklist, sender=BlockedIP)
+post_delete.connect(rebuild_blocklist, sender=BlockedIP)
+post_save.connect(rebuild_blocklist_on_spam, sender=JobStat)
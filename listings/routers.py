@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+''' Sends the listings reads to a read replica.
+
+    Add the router and the middleware to the project settings, e.g. with
+    two local SQLite databases:
+
+        DATABASES = {
+            'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': 'primary.db'},
+            'replica': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': 'replica.db'},
+        }
+        DATABASE_ROUTERS = ['listings.routers.ListingsRouter']
+        MIDDLEWARE_CLASSES += ('listings.routers.PrimaryPinMiddleware',)
+        LISTINGS_READ_DATABASE = 'replica'
+
+    Writes always go to LISTINGS_WRITE_DATABASE. Reads are pinned to it
+    during unsafe requests, in the views decorated with use_primary, and
+    for LISTINGS_PRIMARY_PIN_SECONDS after a user wrote something, so they
+    see their own changes whatever the replication lag.
+'''
+
+from listings.conf import settings as listings_settings
+
+from functools import wraps
+import threading
+import time
+
+PIN_COOKIE = 'listings_primary'
+
+_state = threading.local()
+
+
+def pin_to_primary():
+    _state.pinned = True
+
+
+def unpin():
+    _state.pinned = False
+
+
+def is_pinned():
+    return getattr(_state, 'pinned', False)
+
+
+def use_primary(view):
+    ''' Decorator for the views that write and read their own changes
+        back, the request and the following ones within the pin window
+        are served from the primary database.
+    '''
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        was_pinned = is_pinned()
+        pin_to_primary()
+        request.listings_wrote = True
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            if not was_pinned:
+                unpin()
+    return wrapper
+
+
+class ListingsRouter(object):
+
+    def _routed(self, model):
+        return model._meta.app_label in listings_settings.LISTINGS_ROUTED_APPS
+
+    def db_for_read(self, model, **hints):
+        if not self._routed(model):
+            return None
+        if is_pinned() or not listings_settings.LISTINGS_READ_DATABASE:
+            return listings_settings.LISTINGS_WRITE_DATABASE
+        return listings_settings.LISTINGS_READ_DATABASE
+
+    def db_for_write(self, model, **hints):
+        if not self._routed(model):
+            return None
+        return listings_settings.LISTINGS_WRITE_DATABASE
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # the replica holds the same rows, objects read from it can be
+        # related to objects saved on the primary
+        if self._routed(obj1) and self._routed(obj2):
+            return True
+        return None
+
+    def allow_syncdb(self, db, model):
+        if self._routed(model) and db == listings_settings.LISTINGS_READ_DATABASE:
+            return False
+        return None
+
+
+class PrimaryPinMiddleware(object):
+
+    def process_request(self, request):
+        unpin()
+        pinned_until = request.COOKIES.get(PIN_COOKIE)
+        if request.method not in ('GET', 'HEAD', 'OPTIONS'):
+            pin_to_primary()
+            request.listings_wrote = True
+        elif pinned_until:
+            try:
+                if float(pinned_until) > time.time():
+                    pin_to_primary()
+            except ValueError:
+                pass
+
+    def process_response(self, request, response):
+        if getattr(request, 'listings_wrote', False):
+            seconds = listings_settings.LISTINGS_PRIMARY_PIN_SECONDS
+            response.set_cookie(PIN_COOKIE, str(time.time() + seconds), max_age=seconds)
+        unpin()
+        return response
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+''' The database full-text index of the active jobs, used by job_search
+    when LISTINGS_SEARCH_BACKEND is 'database'.
+
+    On PostgreSQL the jobs get a weighted tsvector column over their title,
+    company and description with a GIN index, and the results are ranked
+    with ts_rank. On SQLite the same fields go to an FTS5 table whose rowid
+    is the job id, ranked with bm25. Either is created by the
+    rebuild_search_index command (and by syncdb), and kept in sync from
+    the job_saved and jobs_updated signals; only active jobs are indexed.
+'''
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections, router, transaction
+
+from listings.models import Job, POSTING_ACTIVE
+from listings.helpers import normalize_query
+from listings.conf import settings as listings_settings
+
+SEARCH_FIELDS = set(['status', 'title', 'company', 'description_text'])
+VECTOR_COLUMN = 'search_vector'
+FTS_TABLE = 'listings_job_fts'
+CHUNK_SIZE = 500  # below the 999 variables SQLite allows per statement
+
+# title, company and description weigh in that order in ts_rank and bm25
+_VECTOR = "setweight(to_tsvector(CAST(%%s AS regconfig), coalesce(%(title)s, '')), 'A') || " \
+          "setweight(to_tsvector(CAST(%%s AS regconfig), coalesce(%(company)s, '')), 'B') || " \
+          "setweight(to_tsvector(CAST(%%s AS regconfig), coalesce(%(description_text)s, '')), 'C')"
+_BM25_WEIGHTS = '10.0, 5.0, 1.0'
+
+
+def is_enabled():
+    return listings_settings.LISTINGS_SEARCH_BACKEND == 'database'
+
+
+def _vendor(connection):
+    if connection.vendor not in ('postgresql', 'sqlite'):
+        raise ImproperlyConfigured('The database search backend needs PostgreSQL or SQLite, '
+                                   'not %s.' % connection.vendor)
+    return connection.vendor
+
+
+def _columns(connection):
+    qn = connection.ops.quote_name
+    return dict((name, qn(Job._meta.get_field(name).column))
+                for name in ('id', 'status', 'title', 'company', 'description_text'))
+
+
+def create_search_index(using=None):
+    ''' Adds the tsvector column and its GIN index, or the FTS5 table, to
+        the database when they're missing. Returns True if it did.
+    '''
+    using = using or router.db_for_write(Job)
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    table = Job._meta.db_table
+    cursor = connection.cursor()
+    if _vendor(connection) == 'postgresql':
+        columns = [row[0] for row in connection.introspection.get_table_description(cursor, table)]
+        if VECTOR_COLUMN in columns:
+            return False
+        cursor.execute('ALTER TABLE %s ADD COLUMN %s tsvector' % (qn(table), qn(VECTOR_COLUMN)))
+        cursor.execute('CREATE INDEX %s ON %s USING GIN (%s)' %
+                       (qn('%s_%s' % (table, VECTOR_COLUMN)), qn(table), qn(VECTOR_COLUMN)))
+    else:
+        if FTS_TABLE in connection.introspection.table_names():
+            return False
+        cursor.execute("CREATE VIRTUAL TABLE %s USING fts5(title, company, description_text, "
+                       "tokenize = 'porter unicode61')" % qn(FTS_TABLE))
+    transaction.commit_unless_managed(using=using)
+    return True
+
+
+def index_jobs(pks=None, using=None):
+    ''' Indexes the given jobs, all of them when None, and drops the ones
+        no longer active or deleted from the index.
+    '''
+    using = using or router.db_for_write(Job)
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    table = qn(Job._meta.db_table)
+    columns = _columns(connection)
+    vendor = _vendor(connection)
+    cursor = connection.cursor()
+    pks = pks is not None and list(pks) or None
+    chunks = [None] if pks is None else [pks[i:i + CHUNK_SIZE] for i in range(0, len(pks), CHUNK_SIZE)]
+    for chunk in chunks:
+        ids, params = '', []
+        if chunk is not None:
+            ids, params = ' IN (%s)' % ', '.join(['%s'] * len(chunk)), list(chunk)
+        if vendor == 'postgresql':
+            config = listings_settings.LISTINGS_SEARCH_CONFIG
+            cursor.execute('UPDATE %s SET %s = CASE WHEN %s = %%s THEN %s ELSE NULL END%s' %
+                           (table, qn(VECTOR_COLUMN), columns['status'], _VECTOR % columns,
+                            ids and ' WHERE %s%s' % (columns['id'], ids)),
+                           [POSTING_ACTIVE, config, config, config] + params)
+        else:
+            cursor.execute('DELETE FROM %s%s' % (qn(FTS_TABLE), ids and ' WHERE rowid%s' % ids), params)
+            cursor.execute('INSERT INTO %s (rowid, title, company, description_text) '
+                           'SELECT %s, %s, %s, %s FROM %s WHERE %s = %%s%s' %
+                           (qn(FTS_TABLE), columns['id'], columns['title'], columns['company'],
+                            columns['description_text'], table, columns['status'],
+                            ids and ' AND %s%s' % (columns['id'], ids)),
+                           [POSTING_ACTIVE] + params)
+    transaction.commit_unless_managed(using=using)
+
+
+def fts5_query(keywords):
+    ''' Returns an FTS5 query matching all the keywords, each keyword or
+        quoted group of words being a phrase so their syntax is not parsed.
+    '''
+    return u' '.join(u'"%s"' % term.replace(u'"', u'""') for term in normalize_query(keywords))
+
+
+def search_jobs(queryset, keywords):
+    ''' Returns the jobs of the queryset matching the keywords, best first.
+    '''
+    connection = connections[queryset.db]
+    qn = connection.ops.quote_name
+    table = qn(Job._meta.db_table)
+    columns = _columns(connection)
+    if _vendor(connection) == 'postgresql':
+        query = 'plainto_tsquery(CAST(%s AS regconfig), %s)'
+        params = [listings_settings.LISTINGS_SEARCH_CONFIG, keywords]
+        vector = '%s.%s' % (table, qn(VECTOR_COLUMN))
+        return queryset.extra(select={'search_rank': 'ts_rank(%s, %s)' % (vector, query)}, select_params=params,
+                              where=['%s @@ %s' % (vector, query)], params=params) \
+                       .order_by('-search_rank', '-created_on')
+    match = fts5_query(keywords)
+    if not match:
+        return queryset.none()
+    fts = qn(FTS_TABLE)
+    rank = '(SELECT bm25(%s, %s) FROM %s WHERE %s MATCH %%s AND rowid = %s.%s)' % \
+           (fts, _BM25_WEIGHTS, fts, fts, table, columns['id'])
+    # bm25 scores are negative, the lower the better
+    return queryset.extra(select={'search_rank': rank}, select_params=[match],
+                          where=['%s.%s IN (SELECT rowid FROM %s WHERE %s MATCH %%s)' % (table, columns['id'], fts, fts)],
+                          params=[match]) \
+                   .order_by('search_rank', '-created_on')
+
+
+def search_job_ids(queryset, keywords, limit):
+    ''' Returns the ids of the limit best jobs of the queryset matching the
+        keywords, the rank being selected too so the ordering by it holds.
+    '''
+    ranked = search_jobs(queryset, keywords).values_list('pk', 'search_rank')[:limit]
+    return [pk for pk, rank in ranked]
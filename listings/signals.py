@@ -0,0 +1,11 @@
+# -*- coding: utf-8 -*-
+
+from django.dispatch import Signal
+
+# Sent at the end of Job.save(), once the job sites are set. `changed` is
+# the set of tracked fields (see Posting.tracked_fields) that changed.
+job_saved = Signal(providing_args=['job', 'created', 'changed'])
+
+# Sent by update_jobs() after jobs were changed with a single UPDATE query,
+# with the primary keys of the jobs and the names of the updated fields.
+jobs_updated = Signal(providing_args=['pks', 'fields'])
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+''' TF-IDF vectors of the active jobs and their nearest neighbours by
+    cosine similarity, computed with NumPy and SciPy sparse matrices. Both
+    are optional dependencies, only needed by update_similar_jobs.
+'''
+
+from django.db import transaction
+from django.utils.importlib import import_module
+
+from listings.models import Job, SimilarJob, POSTING_ACTIVE
+
+import math
+import re
+
+TITLE_WEIGHT = 2
+_WORDS = re.compile(r'\w\w+', re.UNICODE)
+
+
+def is_available():
+    ''' Returns whether numpy and scipy can be imported.
+    '''
+    try:
+        import_module('numpy')
+        import_module('scipy.sparse')
+    except ImportError:
+        return False
+    return True
+
+
+def job_tokens(title, description_text, category_id):
+    ''' Returns the terms of a job, the title words counting twice and the
+        category as a term of its own.
+    '''
+    tokens = _WORDS.findall(description_text.lower())
+    tokens.extend(_WORDS.findall(title.lower()) * TITLE_WEIGHT)
+    if category_id:
+        tokens.append(u'category:%d' % category_id)
+    return tokens
+
+
+def tfidf_matrix(documents):
+    ''' Returns the L2 normalized TF-IDF matrix, a scipy CSR matrix with one
+        row per list of tokens, using sublinear term frequencies.
+    '''
+    import numpy
+    from scipy import sparse
+
+    vocabulary = {}
+    indices, data, indptr = [], [], [0]
+    for tokens in documents:
+        counts = {}
+        for token in tokens:
+            term = vocabulary.setdefault(token, len(vocabulary))
+            counts[term] = counts.get(term, 0) + 1
+        indices.extend(counts.keys())
+        data.extend(1 + math.log(c) for c in counts.values())
+        indptr.append(len(indices))
+    matrix = sparse.csr_matrix((numpy.array(data, dtype=numpy.float64),
+                                numpy.array(indices, dtype=numpy.int32),
+                                numpy.array(indptr, dtype=numpy.int32)),
+                               shape=(len(indptr) - 1, max(len(vocabulary), 1)))
+
+    rows = matrix.shape[0]
+    document_frequency = numpy.bincount(matrix.indices, minlength=matrix.shape[1])
+    idf = numpy.log((1.0 + rows) / (1.0 + document_frequency)) + 1.0
+    matrix = matrix * sparse.diags(idf, 0)
+    norms = numpy.sqrt(numpy.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1.0
+    return sparse.diags(1.0 / norms, 0) * matrix
+
+
+def nearest_neighbours(matrix, rows, k):
+    ''' Yields (row, [(other row, score), ...]) for the given rows of the
+        matrix, the k most similar other rows first.
+    '''
+    import numpy
+
+    similarities = (matrix[rows] * matrix.T).tocsr()
+    for i, row in enumerate(rows):
+        start, end = similarities.indptr[i], similarities.indptr[i + 1]
+        others = similarities.indices[start:end]
+        scores = similarities.data[start:end]
+        keep = (others != row) & (scores > 0)
+        others, scores = others[keep], scores[keep]
+        if len(scores) > k:
+            best = numpy.argpartition(-scores, k)[:k]
+            others, scores = others[best], scores[best]
+        order = numpy.argsort(-scores, kind='mergesort')
+        yield row, [(int(others[j]), float(scores[j])) for j in order]
+
+
+def update_similar_jobs(k, job_ids=None, batch_size=200):
+    ''' Recomputes the k most similar active jobs of the given jobs, all
+        active jobs when None, and of the jobs they are similar to, since a
+        new job may belong in their lists too. Returns the number of jobs
+        updated.
+    '''
+    jobs = list(Job.objects.filter(status=POSTING_ACTIVE).order_by('pk')
+                .values_list('pk', 'title', 'description_text', 'category'))
+    pks = [job[0] for job in jobs]
+    row_of = dict((pk, row) for row, pk in enumerate(pks))
+
+    if job_ids is None:
+        targets = range(len(pks))
+    else:
+        job_ids = set(job_ids)
+        # lists referring to jobs no longer active are refilled
+        job_ids.update(SimilarJob.objects.filter(similar__in=job_ids).values_list('job', flat=True))
+        SimilarJob.objects.filter(job__in=[pk for pk in job_ids if pk not in row_of]).delete()
+        targets = sorted(row_of[pk] for pk in job_ids if pk in row_of)
+    if not targets:
+        return 0
+
+    matrix = tfidf_matrix(job_tokens(title, text, category) for pk, title, text, category in jobs)
+    updated = set()
+    expand = job_ids is not None and set(targets) or set()
+    pending = list(targets)
+    while pending:
+        batch, pending = pending[:batch_size], pending[batch_size:]
+        rows = []
+        neighbours = set()
+        for row, similar in nearest_neighbours(matrix, batch, k):
+            updated.add(row)
+            rows.extend(SimilarJob(job_id=pks[row], similar_id=pks[other], score=score, rank=rank)
+                        for rank, (other, score) in enumerate(similar))
+            if row in expand:
+                neighbours.update(other for other, score in similar)
+        if neighbours:
+            pending.extend(sorted(neighbours - updated - set(pending)))
+        with transaction.commit_on_success():
+            SimilarJob.objects.filter(job__in=[pks[row] for row in batch]).delete()
+            SimilarJob.objects.bulk_create(rows)
+    return len(updated)
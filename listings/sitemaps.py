@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+
+from django.contrib.sites.models import Site
+from django.core.urlresolvers import reverse
+from django.utils.html import escape
+
+from listings.models import Job, get_job_counts
+from listings.helpers import get_job_path_format
+
+from categories.models import Category
+from cities_light.models import City
+
+import zlib
+
+SITEMAP_LIMIT = 50000
+SECTIONS = ('jobs', 'categories', 'cities', 'companies')
+
+URLSET_HEADER = '<?xml version="1.0" encoding="UTF-8"?>\n' \
+                '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+URLSET_FOOTER = '</urlset>\n'
+INDEX_HEADER = '<?xml version="1.0" encoding="UTF-8"?>\n' \
+               '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+INDEX_FOOTER = '</sitemapindex>\n'
+
+
+def _job_paths():
+    path = get_job_path_format()
+    rows = Job.active.order_by('pk').values_list('pk', 'ad_url', 'created_on')
+    return rows, lambda row: (path % {'pk': row[0], 'ad_url': row[1]}, row[2])
+
+
+def _section_rows(section):
+    ''' Returns a (rows, to_url) tuple for the section, where rows is a
+        values_list queryset and to_url turns a row in a (path, lastmod)
+        tuple.
+    '''
+    if section == 'jobs':
+        return _job_paths()
+    elif section == 'categories':
+        ids = get_job_counts('category').keys()
+        rows = Category.objects.filter(pk__in=ids).order_by('pk').values_list('slug', flat=True)
+        return rows, lambda slug: (reverse('listings_job_list_category', args=[slug]), None)
+    elif section == 'cities':
+        ids = [pk for pk in get_job_counts('city').keys() if pk]
+        rows = City.objects.filter(pk__in=ids).order_by('pk').values_list('ascii_name', flat=True)
+        return rows, lambda name: (reverse('listings_jobs_in_city', args=[name]), None)
+    elif section == 'companies':
+        rows = Job.active.order_by('company_slug').values_list('company_slug', flat=True).distinct()
+        return rows, lambda slug: (reverse('listings_jobs_at', args=[slug]), None)
+    raise ValueError('Unknown sitemap section: %s' % section)
+
+
+def get_page_count(section):
+    rows, to_url = _section_rows(section)
+    return max((rows.count() + SITEMAP_LIMIT - 1) // SITEMAP_LIMIT, 1)
+
+
+def _base_url():
+    return 'http://%s' % Site.objects.get_current().domain
+
+
+def iter_sitemap(section, page):
+    ''' Yields the xml of the given 1-based page of a sitemap section,
+        reading the urls with iterator() rather than loading models.
+    '''
+    rows, to_url = _section_rows(section)
+    base_url = _base_url()
+    start = (page - 1) * SITEMAP_LIMIT
+    yield URLSET_HEADER
+    for row in rows[start:start + SITEMAP_LIMIT].iterator():
+        path, lastmod = to_url(row)
+        entry = '<url><loc>%s%s</loc>' % (base_url, escape(path))
+        if lastmod:
+            entry += '<lastmod>%s</lastmod>' % lastmod.strftime('%Y-%m-%d')
+        yield entry + '</url>\n'
+    yield URLSET_FOOTER
+
+
+def iter_sitemap_index(location):
+    ''' Yields the xml of the sitemap index, `location` maps a (section,
+        page) tuple to the url of that sitemap.
+    '''
+    yield INDEX_HEADER
+    for section in SECTIONS:
+        for page in range(1, get_page_count(section) + 1):
+            yield '<sitemap><loc>%s</loc></sitemap>\n' % escape(location(section, page))
+    yield INDEX_FOOTER
+
+
+def gzip_stream(chunks):
+    ''' Gzips an iterable of strings on the fly.
+    '''
+    compressor = zlib.compressobj(9, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8') if isinstance(chunk, unicode) else chunk)
+        if data:
+            yield data
+    yield compressor.flush()
@@ -0,0 +1,279 @@
+# -*- coding: utf-8 -*-
+''' An in-memory copy of the active jobs of the current site, kept by each
+    worker when LISTINGS_SNAPSHOT is on so the job lists don't query the
+    job table to filter, sort, count and facet.
+
+    Each job is a JobRecord with __slots__, and the jobs are indexed by
+    compact arrays of ids sorted newest first: one of every job, and one
+    per category, job type, city and company. Saving or updating jobs adds
+    their ids to a change log in the cache under a counter, and a worker
+    whose snapshot is behind the counter reloads just those jobs. A shared
+    cache backend (e.g. memcached) is needed for the workers to see each
+    other's changes.
+'''
+
+from django.conf import settings as django_settings
+from django.core.cache import cache
+from django.db.models.query import QuerySet
+
+from listings.cache import VERSION_TIMEOUT
+from listings.conf import settings as listings_settings
+
+from array import array
+from calendar import timegm
+import threading
+import time
+
+FIELDS = ('pk', 'created_on', 'category', 'jobtype', 'city', 'company_slug', 'company')
+DIMENSIONS = ('category_id', 'jobtype_id', 'city_id', 'company_slug')
+
+COUNTER_KEY = 'listings:snapshot:counter'
+CHANGES_TIMEOUT = 60 * 60 * 24
+
+
+def _change_key(counter):
+    return 'listings:snapshot:change:%d' % counter
+
+
+class JobRecord(object):
+    __slots__ = ('pk', 'created_on', 'category_id', 'jobtype_id', 'city_id', 'company_slug')
+
+    def __init__(self, pk, created_on, category_id, jobtype_id, city_id, company_slug):
+        self.pk = pk
+        # a timestamp takes a fraction of the memory of a datetime
+        self.created_on = timegm(created_on.timetuple()) + created_on.microsecond / 1e6
+        self.category_id = category_id
+        self.jobtype_id = jobtype_id
+        self.city_id = city_id
+        self.company_slug = company_slug
+
+    def sort_key(self):
+        return (-self.created_on, -self.pk)
+
+
+def _record(row, companies):
+    pk, created_on, category_id, jobtype_id, city_id, company_slug, company = row
+    # the jobs of a company share one copy of its slug and name
+    company_slug = companies.setdefault(company_slug, (company_slug, company))[0]
+    if companies[company_slug][1] != company:
+        companies[company_slug] = (company_slug, company)
+    return JobRecord(pk, created_on, category_id, jobtype_id, city_id, company_slug)
+
+
+def _position(ids, records, key):
+    # bisect_left over the ids by the sort key of their records
+    lo, hi = 0, len(ids)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if records[ids[mid]].sort_key() < key:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+
+class Snapshot(object):
+    ''' The active jobs as of the given change counter. Never modified once
+        built, so threads can keep reading it while a newer one is built.
+    '''
+    def __init__(self, counter, records, companies, ids, indexes, loaded_on=None):
+        self.counter = counter
+        self.records = records
+        self.companies = companies
+        self.ids = ids
+        self.indexes = indexes
+        self.loaded_on = loaded_on or time.time()
+
+    @classmethod
+    def from_rows(cls, counter, rows):
+        ''' Builds a snapshot from (pk, created_on, category, jobtype, city,
+            company_slug, company) rows.
+        '''
+        companies = {}
+        records = dict((row[0], _record(row, companies)) for row in rows)
+        ids = array('l')
+        indexes = dict((dimension, {}) for dimension in DIMENSIONS)
+        for record in sorted(records.values(), key=JobRecord.sort_key):
+            ids.append(record.pk)
+            for dimension in DIMENSIONS:
+                key = getattr(record, dimension)
+                if key not in indexes[dimension]:
+                    indexes[dimension][key] = array('l')
+                indexes[dimension][key].append(record.pk)
+        return cls(counter, records, companies, ids, indexes)
+
+    def updated(self, counter, pks, rows):
+        ''' Returns a new snapshot where the jobs of the given ids are
+            replaced by the given rows, the jobs without a row being gone.
+            Only the arrays the changes touch are copied.
+        '''
+        records = dict(self.records)
+        companies = dict(self.companies)
+        ids = array('l', self.ids)
+        indexes = dict((dimension, dict(keys)) for dimension, keys in self.indexes.items())
+        copied = set()
+
+        def index(dimension, key):
+            if (dimension, key) not in copied:
+                indexes[dimension][key] = array('l', indexes[dimension].get(key, ()))
+                copied.add((dimension, key))
+            return indexes[dimension][key]
+
+        for pk in pks:
+            old = records.get(pk)
+            if old is None:
+                continue
+            key = old.sort_key()
+            del ids[_position(ids, records, key)]
+            for dimension in DIMENSIONS:
+                job_ids = index(dimension, getattr(old, dimension))
+                del job_ids[_position(job_ids, records, key)]
+                if not job_ids:
+                    del indexes[dimension][getattr(old, dimension)]
+                    copied.discard((dimension, getattr(old, dimension)))
+            del records[pk]
+
+        for row in rows:
+            record = _record(row, companies)
+            key = record.sort_key()
+            records[record.pk] = record
+            ids.insert(_position(ids, records, key), record.pk)
+            for dimension in DIMENSIONS:
+                job_ids = index(dimension, getattr(record, dimension))
+                job_ids.insert(_position(job_ids, records, key), record.pk)
+        return Snapshot(counter, records, companies, ids, indexes, self.loaded_on)
+
+    def job_ids(self, **filters):
+        ''' Returns the ids of the jobs matching the given dimensions,
+            newest first, e.g. job_ids(category_id=1, city_id=None) for the
+            jobs of category 1 outside of the listed cities.
+        '''
+        if not filters:
+            return self.ids
+        candidates = sorted((self.indexes[dimension].get(key, ()) for dimension, key in filters.items()),
+                            key=len)
+        if len(candidates) == 1:
+            return candidates[0]
+        records = self.records
+        return [pk for pk in candidates[0]
+                if all(getattr(records[pk], d) == key for d, key in filters.items())]
+
+    def facet_rows(self, ids):
+        ''' Yields the (category, jobtype, city, company_slug, company)
+            rows of the jobs, as counted by listings.facets.
+        '''
+        for pk in ids:
+            record = self.records[pk]
+            yield (record.category_id, record.jobtype_id, record.city_id,
+                   record.company_slug, self.companies[record.company_slug][1])
+
+
+def _job_rows(pks=None):
+    from listings.models import Job
+    queryset = Job.active.all()
+    if pks is not None:
+        queryset = queryset.filter(pk__in=pks)
+    return queryset.values_list(*FIELDS).iterator()
+
+
+def get_counter():
+    counter = cache.get(COUNTER_KEY)
+    if counter is None:
+        cache.add(COUNTER_KEY, 0, VERSION_TIMEOUT)
+        counter = cache.get(COUNTER_KEY, 0)
+    return counter
+
+
+def record_changes(pks):
+    ''' Tells the workers the given jobs changed.
+    '''
+    pks = list(pks)
+    if not pks:
+        return
+    try:
+        counter = cache.incr(COUNTER_KEY)
+    except ValueError:
+        # the counter was evicted, the workers notice it went back
+        counter = 1
+        cache.set(COUNTER_KEY, counter, VERSION_TIMEOUT)
+    cache.set(_change_key(counter), pks, CHANGES_TIMEOUT)
+
+
+def _refresh(snapshot, counter):
+    if snapshot is not None and snapshot.counter < counter <= snapshot.counter + \
+            listings_settings.LISTINGS_SNAPSHOT_MAX_CHANGES:
+        keys = [_change_key(c) for c in range(snapshot.counter + 1, counter + 1)]
+        changes = cache.get_many(keys)
+        if len(changes) == len(keys):
+            pks = set()
+            for change in changes.values():
+                pks.update(change)
+            return snapshot.updated(counter, pks, _job_rows(pks))
+    # too many changes, some were evicted or the counter was reset
+    return Snapshot.from_rows(counter, _job_rows())
+
+
+_lock = threading.Lock()
+_snapshots = {}
+
+
+def get_snapshot():
+    ''' Returns the up to date snapshot of the current site, or None when
+        LISTINGS_SNAPSHOT is off. It's fully reloaded every
+        LISTINGS_SNAPSHOT_MAX_AGE seconds in case a change was missed.
+    '''
+    if not listings_settings.LISTINGS_SNAPSHOT:
+        return None
+    site_id = django_settings.SITE_ID
+    counter = get_counter()
+
+    def is_current(snapshot):
+        return snapshot is not None and snapshot.counter == counter and not is_expired(snapshot)
+
+    def is_expired(snapshot):
+        return time.time() - snapshot.loaded_on >= listings_settings.LISTINGS_SNAPSHOT_MAX_AGE
+
+    snapshot = _snapshots.get(site_id)
+    if is_current(snapshot):
+        return snapshot
+    with _lock:
+        snapshot = _snapshots.get(site_id)
+        if not is_current(snapshot):
+            if snapshot is not None and is_expired(snapshot):
+                snapshot = None
+            snapshot = _snapshots[site_id] = _refresh(snapshot, counter)
+    return snapshot
+
+
+class SnapshotJobList(object):
+    ''' A list of job ids that looks enough like a queryset for the
+        object_list generic view, loading only the jobs of the page shown.
+        The ids may also be a values_list queryset, which is then counted
+        and sliced in the database.
+    '''
+    def __init__(self, ids):
+        from listings.models import Job
+        self.model = Job
+        self.ids = ids
+
+    def _clone(self):
+        return self
+
+    def count(self):
+        if isinstance(self.ids, QuerySet):
+            return self.ids.count()
+        return len(self.ids)
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        ids = list(self.ids[index])
+        jobs = self.model.objects.select_related('jobtype', 'city').in_bulk(ids)
+        # a job deleted since the snapshot was taken is left out
+        return [jobs[pk] for pk in ids if pk in jobs]
+
+    def __iter__(self):
+        return iter(self[:])
@@ -4,13 +4,34 @@ from django import template
 from django.utils.safestring import mark_safe
 from django.db.models import Count
 from django.template.defaultfilters import stringfilter
+from django.core.cache import cache
+from django.conf import settings as django_settings
+from django.utils import translation
+
+from listings.models import Job, Type, JobStat, get_job_counts, get_similar_jobs
+from listings.cache import get_version, get_versions
+from listings.conf import settings as listings_settings
 
-from listings.models import Job, Type, JobStat
 from categories.models import Category
 
 import re
 
 
+def get_top_jobs(name, queryset, num):
+    ''' Returns the `num` newest jobs of the queryset. Their ids are cached
+        per site until a job is activated, deactivated, featured or
+        re-dated (see listings.receivers), and the jobs are loaded with a
+        single in_bulk().
+    '''
+    key = 'listings:top:%s:%s:%d:%s' % (django_settings.SITE_ID, name, num, get_version('top_jobs'))
+    job_ids = cache.get(key)
+    if job_ids is None:
+        job_ids = list(queryset.order_by('-created_on', '-pk').values_list('pk', flat=True)[:num])
+        cache.set(key, job_ids, listings_settings.LISTINGS_TOP_JOBS_CACHE_TIMEOUT)
+    jobs = Job.objects.select_related('jobtype', 'city').in_bulk(job_ids)
+    return [jobs[pk] for pk in job_ids if pk in jobs]
+
+
 # latest jobs template tag
 def do_latest_jobs(parser, token):
     bits = token.split_contents()
@@ -25,7 +46,7 @@ class LatestJobsNode(template.Node):
         self.varname = varname
 
     def render(self, context):
-        context[self.varname] = Job.on_site.all().order_by('-created_on')[:self.num]
+        context[self.varname] = get_top_jobs('latest', Job.active.all(), self.num)
         return ''
 
 
@@ -43,7 +64,7 @@ class SpotlightJobsNode(template.Node):
         self.varname = varname
 
     def render(self, context):
-        context[self.varname] = Job.on_site.filter(featured=True).order_by('-created_on')[:self.num]
+        context[self.varname] = get_top_jobs('featured', Job.active.filter(featured=True), self.num)
         return ''
 
 
@@ -69,6 +90,103 @@ class MostAppliedJobsNode(template.Node):
         return ''
 
 
+# similar jobs template tag
+def do_similar_jobs(parser, token):
+    bits = token.split_contents()
+    if len(bits) != 4:
+        raise template.TemplateSyntaxError("'get_similar_jobs' tag takes exactly four arguments")
+    return SimilarJobsNode(bits[1], bits[3])
+
+
+class SimilarJobsNode(template.Node):
+    def __init__(self, job, varname):
+        self.job = template.Variable(job)
+        self.varname = varname
+
+    def render(self, context):
+        context[self.varname] = get_similar_jobs(self.job.resolve(context))
+        return ''
+
+
+# job row fragment cache template tags
+ROW_PREFETCH_KEY = 'listings_job_rows'
+
+
+def job_row_key(name, job_id, version):
+    return 'listings:row:%s:%s:%s:%d:%s' % (django_settings.SITE_ID, translation.get_language(),
+                                            name, job_id, version)
+
+
+def do_cache_job_row(parser, token):
+    bits = token.split_contents()
+    if len(bits) != 3:
+        raise template.TemplateSyntaxError("'cache_job_row' tag takes exactly two arguments")
+    nodelist = parser.parse(('end_cache_job_row',))
+    parser.delete_first_token()
+    return CachedJobRowNode(nodelist, bits[1], bits[2])
+
+
+class CachedJobRowNode(template.Node):
+    ''' Caches the markup of a job row under the job's version, which
+        listings.receivers bumps whenever the job is saved or updated, so
+        a row is rendered once for every page showing it.
+    '''
+    def __init__(self, nodelist, name, job):
+        self.nodelist = nodelist
+        self.name = template.Variable(name)
+        self.job = template.Variable(job)
+
+    def render(self, context):
+        timeout = listings_settings.LISTINGS_ROW_CACHE_TIMEOUT
+        if not timeout:
+            return self.nodelist.render(context)
+        name = self.name.resolve(context)
+        job = self.job.resolve(context)
+        prefetched = context.render_context.get(ROW_PREFETCH_KEY, {})
+        if (name, job.pk) in prefetched:
+            key, content = prefetched[(name, job.pk)]
+        else:
+            key = job_row_key(name, job.pk, get_version('job:%d' % job.pk))
+            content = cache.get(key)
+        if content is None:
+            content = self.nodelist.render(context)
+            cache.set(key, content, timeout)
+            if (name, job.pk) in prefetched:
+                prefetched[(name, job.pk)] = (key, content)
+        return content
+
+
+def do_prefetch_job_rows(parser, token):
+    bits = token.split_contents()
+    if len(bits) != 3:
+        raise template.TemplateSyntaxError("'prefetch_job_rows' tag takes exactly two arguments")
+    return PrefetchJobRowsNode(bits[1], bits[2])
+
+
+class PrefetchJobRowsNode(template.Node):
+    ''' Reads the versions and the cached rows of a list of jobs with two
+        cache requests, for the cache_job_row tags that follow.
+    '''
+    def __init__(self, name, jobs):
+        self.name = template.Variable(name)
+        self.jobs = template.Variable(jobs)
+
+    def render(self, context):
+        if not listings_settings.LISTINGS_ROW_CACHE_TIMEOUT:
+            return ''
+        name = self.name.resolve(context)
+        job_ids = [job.pk for job in self.jobs.resolve(context)]
+        versions = get_versions(['job:%d' % pk for pk in job_ids])
+        keys = dict((pk, job_row_key(name, pk, versions['job:%d' % pk])) for pk in job_ids)
+        rows = cache.get_many(keys.values())
+        if ROW_PREFETCH_KEY not in context.render_context:
+            context.render_context[ROW_PREFETCH_KEY] = {}
+        prefetched = context.render_context[ROW_PREFETCH_KEY]
+        for pk, key in keys.items():
+            prefetched[(name, pk)] = (key, rows.get(key))
+        return ''
+
+
 # categories template tag
 def do_categories(parser, token):
     return CategoriesNode()
@@ -76,8 +194,12 @@ def do_categories(parser, token):
 
 class CategoriesNode(template.Node):
     def render(self, context):
-        context['total_jobs'] = Job.on_site.all().count()
-        context['categories'] = Category.on_site.all().order_by('order')
+        counts = get_job_counts('category')
+        categories = list(Category.on_site.filter(pk__in=counts.keys()).order_by('order'))
+        for category in categories:
+            category.jobs_count = counts[category.pk]
+        context['total_jobs'] = get_job_counts('all').get(0, 0)
+        context['categories'] = categories
         return ''
 
 
@@ -87,7 +209,11 @@ def do_jobtypes(parser, token):
 
 class JobtypesNode(template.Node):
     def render(self, context):
-        context['jobtypes'] = Type.on_site.all()
+        counts = get_job_counts('jobtype')
+        jobtypes = list(Type.on_site.all())
+        for jobtype in jobtypes:
+            jobtype.jobs_count = counts.get(jobtype.pk, 0)
+        context['jobtypes'] = jobtypes
         return ''
 
 NOFOLLOW_RE = re.compile(u'<a (?![^>]*rel=["\']nofollow[\'"])' \
@@ -102,6 +228,9 @@ register = template.Library()
 register.tag('get_latest_jobs', do_latest_jobs)
 register.tag('get_featured_jobs', do_featured_jobs)
 register.tag('get_most_applied_jobs', do_most_applied_jobs)
+register.tag('get_similar_jobs', do_similar_jobs)
+register.tag('cache_job_row', do_cache_job_row)
+register.tag('prefetch_job_rows', do_prefetch_job_rows)
 register.tag('get_categories', do_categories)
 register.tag('get_jobtypes', do_jobtypes)
 register.filter(nofollow)
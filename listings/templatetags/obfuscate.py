@@ -5,8 +5,6 @@ from django.template.defaultfilters import stringfilter
 from django.utils.safestring import mark_safe
 from django.utils.html import strip_tags
 
-from bs4 import BeautifulSoup
-
 import re
 
 from rendertext import render
@@ -24,6 +22,7 @@ def _get_strings(string):
 @register.filter()
 @stringfilter
 def obfuscate_emails(value):
+    from bs4 import BeautifulSoup
 
     soup = BeautifulSoup(value, 'html.parser')
     value = soup.prettify()
@@ -9,7 +9,7 @@ from django.conf import settings
 from django.forms.util import flatatt
 from django.utils.safestring import mark_safe
 
-from PIL import Image, ImageFont, ImageDraw, ImageColor
+from listings.helpers import LRUCache
 
 import md5
 import os
@@ -17,6 +17,51 @@ import urlparse
 
 register = template.Library()
 
+# loaded fonts by (fontalias, size) and (url, width, height) of the
+# rendered images by render arguments, so repeated renders of the same
+# text do no font loading nor filesystem work
+_fonts = LRUCache(getattr(settings, 'RENDERTEXT_FONT_CACHE_SIZE', 32))
+_rendered = LRUCache(getattr(settings, 'RENDERTEXT_CACHE_SIZE', 1024))
+
+
+def get_font(fontalias, size):
+    """Return the truetype font for 'fontalias' at the given size,
+    loading it only the first time it's requested."""
+    from PIL import ImageFont
+
+    key = (fontalias, size)
+    font = _fonts.get(key)
+    if font is None:
+        font = ImageFont.truetype(settings.RENDERTEXT_FONTMAP[fontalias], size)
+        _fonts.set(key, font)
+    return font
+
+
+def to_transparent_gif(im):
+    """Convert an RGBA image to a palette image for GIF output.
+
+    Returns a tuple with the palette image and the palette index to be
+    used as the transparent color. Unfortunately, PIL support for
+    palette mode is rather flaky so we have to hack it a bit: the least
+    used palette index is picked as background, and every fully
+    transparent pixel of the source is set to it."""
+    from PIL import Image
+
+    pim = im.convert('P', dither=Image.NONE)
+
+    # locate a good background color index
+    hist = pim.histogram()
+    min_val = min(hist)
+    index = 0
+    if min_val < 1000000:
+        index = hist.index(min_val)
+
+    # patch any fully transparent pixels
+    mask = im.split()[3].point(lambda alpha: alpha == 0 and 255 or 0)
+    pim.paste(index, None, mask)
+
+    return pim, index
+
 
 def render(text, fontalias, size=12, color="#000", rotation=0, bg_color=None):
     """Construct image from text.
@@ -40,13 +85,18 @@ def render(text, fontalias, size=12, color="#000", rotation=0, bg_color=None):
     if hasattr(settings, "RENDERTEXT_DIR"):
         render_dir = settings.RENDERTEXT_DIR
 
-    fontmap = settings.RENDERTEXT_FONTMAP
-    fontfile = fontmap[fontalias]
-
     gifmode = False
     if hasattr(settings, "RENDERTEXT_OUTPUT_FORMAT"):
         gifmode = settings.RENDERTEXT_OUTPUT_FORMAT == 'gif'
 
+    cache_key = (text, fontalias, size, color, rotation, bg_color, gifmode, render_dir)
+    rendered = _rendered.get(cache_key)
+    if rendered is not None:
+        return rendered
+
+    # PIL is heavy, load it on the first render instead of on import
+    from PIL import Image, ImageDraw, ImageColor
+
     # file path
     info = "|".join([text, fontalias, str(size), str(color), str(rotation)])
     name = md5.new(info.encode('utf-8')).hexdigest()
@@ -72,7 +122,7 @@ def render(text, fontalias, size=12, color="#000", rotation=0, bg_color=None):
     dim = (-1, -1)
     if not os.access(filepath, os.F_OK):
         # construct the image
-        imf = ImageFont.truetype(fontfile, size)
+        imf = get_font(fontalias, size)
         dim = imf.getsize(text)
         im = Image.new("RGBA", dim, bg_color)
 
@@ -95,31 +145,7 @@ def render(text, fontalias, size=12, color="#000", rotation=0, bg_color=None):
             os.makedirs(os.path.join(settings.MEDIA_ROOT, render_dir))
 
         if gifmode:
-            # unfortunately, PIL support for palette mode is rather
-            # flaky so we have to hack it a bit
-
-            oldim = im
-            im = im.convert('P', dither=Image.NONE)
-
-            # locate a good background color index
-            hist = im.histogram()
-            min_val = 1000000
-            index = 0
-            for i in range(0, len(hist)):
-                if hist[i] < min_val:
-                    min_val = hist[i]
-                    index = i
-                    if min_val == 0:
-                        break
-
-            # patch any fully transparent pixels
-            src = oldim.load()
-            dest = im.load()
-            for y in range(0, dim[1]):
-                for x in range(0, dim[0]):
-                    if src[x, y][3] == 0:
-                        dest[x, y] = index
-
+            im, index = to_transparent_gif(im)
             im.save(filepath, "GIF", transparency=index)
         else:
             im.save(filepath, "PNG")
@@ -128,7 +154,9 @@ def render(text, fontalias, size=12, color="#000", rotation=0, bg_color=None):
         im = Image.open(filepath)
         dim = im.size
 
-    return (fileurl, dim[0], dim[1])
+    rendered = (fileurl, dim[0], dim[1])
+    _rendered.set(cache_key, rendered)
+    return rendered
 
 
 def escape_for_attribute(s):
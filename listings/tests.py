@@ -134,8 +134,12 @@ class JobTestCase(unittest.TestCase):
         response = self.client.get(reverse('listings_job_list'))
         # Check that the response is 200 OK
         self.failUnlessEqual(response.status_code, 200)
-        # Assert that number of categories is correct
-        self.assertEqual(len(response.context['categories']), 4)
+        # Only the categories with active jobs are listed
+        self.assertEqual(len(response.context['categories']), 0)
+        self.job_1.activate()
+        response = self.client.get(reverse('listings_job_list'))
+        self.assertEqual(response.context['categories'], [self.category_1])
+        self.assertEqual(response.context['categories'][0].jobs_count, 1)
 
     def testActivateView(self):
         response = self.client.post(self.job_1.get_activation_url())
@@ -151,3 +155,329 @@ class JobTestCase(unittest.TestCase):
         # Assert that job status has been changed
         self.assertEqual(response.context['page_type'], 'deactivate')
 
+
+    def testFacetCounts(self):
+        from listings.facets import get_facet_counts
+        facets = get_facet_counts(Job.objects.filter(pk__in=[self.job_1.pk, self.job_2.pk]))
+        self.assertEqual(facets['jobtype'], [(self.job_type_1, 2)])
+        self.assertEqual(sorted(c for _, c in facets['category']), [1, 1])
+        self.assertEqual(facets['city'], [(self.city_1, 1)])
+        self.assertEqual(sorted(company['company_slug'] for company, _ in facets['company']),
+                         ['tyrell-corp', 'tyrell-corporation'])
+
+    def testJobCounts(self):
+        from listings.models import get_job_counts
+        total = get_job_counts('all').get(0)
+        self.job_1.activate()
+        self.assertEqual(get_job_counts('all').get(0), total + 1)
+        self.assertEqual(get_job_counts('category').get(self.category_1.pk), 1)
+        self.assertEqual(get_job_counts('city').get(self.city_1.pk), 1)
+        # the sites being cleared are read before they're gone
+        site_ids = list(self.job_1.sites.values_list('pk', flat=True))
+        self.job_1.sites.clear()
+        self.assertEqual(get_job_counts('category').get(self.category_1.pk), None)
+        self.job_1.sites.add(*site_ids)
+        self.assertEqual(get_job_counts('category').get(self.category_1.pk), 1)
+        self.job_1.deactivate()
+        self.assertEqual(get_job_counts('category').get(self.category_1.pk), None)
+        self.assertEqual(get_job_counts('all').get(0), total)
+
+
+class LRUCacheTestCase(unittest.TestCase):
+
+    def testEviction(self):
+        from listings.helpers import LRUCache
+        cache = LRUCache(2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        # reading 'a' makes 'b' the least recently used item
+        self.assertEqual(cache.get('a'), 1)
+        cache.set('c', 3)
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.get('b'), None)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.get('c'), 3)
+
+
+class RouterTestCase(unittest.TestCase):
+
+    def setUp(self):
+        from listings.routers import ListingsRouter
+        self.router = ListingsRouter()
+        self.read_database = settings.LISTINGS_READ_DATABASE
+        settings.LISTINGS_READ_DATABASE = 'replica'
+
+    def tearDown(self):
+        from listings.routers import unpin
+        unpin()
+        settings.LISTINGS_READ_DATABASE = self.read_database
+
+    def testReadsGoToReplica(self):
+        self.assertEqual(self.router.db_for_read(Job), 'replica')
+        self.assertEqual(self.router.db_for_write(Job), settings.LISTINGS_WRITE_DATABASE)
+
+    def testPinnedReadsGoToPrimary(self):
+        from listings.routers import pin_to_primary
+        pin_to_primary()
+        self.assertEqual(self.router.db_for_read(Job), settings.LISTINGS_WRITE_DATABASE)
+
+    def testUsePrimaryMarksRequest(self):
+        from listings.routers import use_primary, is_pinned
+        seen = []
+
+        def view(request):
+            seen.append(is_pinned())
+
+        from django.http import HttpRequest
+        request = HttpRequest()
+        use_primary(view)(request)
+        self.assertEqual(seen, [True])
+        self.assertEqual(is_pinned(), False)
+        self.assertEqual(request.listings_wrote, True)
+
+
+class APICursorTestCase(unittest.TestCase):
+
+    def testRoundTrip(self):
+        from datetime import datetime
+        from listings.api import encode_cursor, decode_cursor
+        created_on = datetime(2013, 5, 17, 10, 30, 12, 5012)
+        self.assertEqual(decode_cursor(encode_cursor(created_on, 42)), (created_on, 42))
+
+    def testInvalidCursor(self):
+        from listings.api import decode_cursor, APIError
+        self.assertRaises(APIError, decode_cursor, 'not a cursor')
+
+
+class DedupeTestCase(unittest.TestCase):
+
+    def testSimilarity(self):
+        from listings import dedupe
+        text = u'Senior Python developer wanted to build our job board with Django and PostgreSQL, remote friendly team'
+        reposted = text.replace('remote friendly team', 'remote friendly company')
+        other = u'Accountant needed for a small bakery, part time, Excel skills and a driving license required'
+        signature = dedupe.minhash(text)
+        self.assertEqual(len(signature), dedupe.NUM_HASHES)
+        self.assertEqual(signature, dedupe.minhash(text))
+        self.assertTrue(dedupe.similarity(signature, dedupe.minhash(reposted)) > 0.5)
+        self.assertTrue(dedupe.similarity(signature, dedupe.minhash(other)) < 0.2)
+        # near-duplicates share at least one band
+        self.assertTrue(set(dedupe.band_keys(signature)) & set(dedupe.band_keys(dedupe.minhash(reposted))))
+
+
+class BlocklistTestCase(unittest.TestCase):
+
+    def setUp(self):
+        import tempfile
+        fd, self.path = tempfile.mkstemp()
+
+    def tearDown(self):
+        import os
+        os.remove(self.path)
+
+    def testLookup(self):
+        from listings import blocklist
+        count = blocklist.write_blocklist(['192.0.2.0/24', '192.0.2.7', '198.51.100.9', '2001:db8::/32'], self.path)
+        # the address inside the /24 is merged into it
+        self.assertEqual(count, 3)
+        self.assertTrue(blocklist.is_blocked('192.0.2.200', self.path))
+        self.assertTrue(blocklist.is_blocked('198.51.100.9', self.path))
+        self.assertTrue(blocklist.is_blocked('2001:db8::1', self.path))
+        self.assertFalse(blocklist.is_blocked('198.51.100.10', self.path))
+        self.assertFalse(blocklist.is_blocked('192.0.3.1', self.path))
+        self.assertFalse(blocklist.is_blocked('not an address', self.path))
+        # only the address appended by the proxy to X-Forwarded-For counts
+        self.assertTrue(blocklist.is_blocked('198.51.100.10, 192.0.2.200', self.path))
+        self.assertFalse(blocklist.is_blocked('192.0.2.200, 198.51.100.10', self.path))
+
+    def testInvalidNetwork(self):
+        from listings import blocklist
+        self.assertRaises(ValueError, blocklist.network_range, '192.0.2.0/33')
+        self.assertRaises(ValueError, blocklist.network_range, 'example.com')
+
+
+class SimilarJobsTestCase(unittest.TestCase):
+
+    def testNearestNeighbours(self):
+        from listings.similar import is_available, job_tokens, tfidf_matrix, nearest_neighbours
+        if not is_available():
+            self.skipTest('numpy and scipy are optional')
+        matrix = tfidf_matrix([
+            job_tokens(u'Python developer', u'Django, Python and PostgreSQL web apps', 1),
+            job_tokens(u'Senior Python developer', u'Python web apps with Django', 1),
+            job_tokens(u'Accountant', u'Taxes, invoices, books', 2),
+        ])
+        neighbours = dict(nearest_neighbours(matrix, [0, 2], 1))
+        self.assertEqual([other for other, score in neighbours[0]], [1])
+        self.assertEqual(neighbours[2], [])
+
+
+class CityGridTestCase(unittest.TestCase):
+
+    def testWithin(self):
+        from listings.geo import CityGrid, haversine
+        cities = [(1, 52.52, 13.40),    # Berlin
+                  (2, 52.39, 13.06),    # Potsdam
+                  (3, 53.55, 9.99),     # Hamburg
+                  (4, 48.14, 11.58),    # Munich
+                  (5, -16.50, 179.90),  # across the antimeridian from 6
+                  (6, -16.50, -179.90)]
+        grid = CityGrid(cities, 1.0)
+        near_berlin = grid.within(52.52, 13.40, 50)
+        self.assertEqual(sorted(near_berlin), [1, 2])
+        self.assertTrue(25 < near_berlin[2] < 30)
+        self.assertEqual(sorted(grid.within(52.52, 13.40, 300)), [1, 2, 3])
+        self.assertEqual(sorted(grid.within(-16.50, 179.90, 50)), [5, 6])
+        self.assertAlmostEqual(haversine(52.52, 13.40, 52.52, 13.40), 0)
+
+
+class SnapshotTestCase(unittest.TestCase):
+
+    def testUpdated(self):
+        from datetime import datetime
+        from listings.snapshot import Snapshot
+        rows = [(1, datetime(2012, 1, 1), 1, 1, None, 'acme', 'Acme'),
+                (2, datetime(2012, 1, 2), 1, 2, 5, 'acme', 'Acme'),
+                (3, datetime(2012, 1, 3), 2, 1, 5, 'initech', 'Initech')]
+        snapshot = Snapshot.from_rows(0, rows)
+        self.assertEqual(list(snapshot.job_ids()), [3, 2, 1])
+        self.assertEqual(list(snapshot.job_ids(category_id=1)), [2, 1])
+        self.assertEqual(list(snapshot.job_ids(category_id=1, city_id=None)), [1])
+        # job 2 is deactivated, job 4 is added and job 1 moves to category 2
+        updated = snapshot.updated(1, [1, 2, 4], [(1, datetime(2012, 1, 1), 2, 1, None, 'acme', 'Acme'),
+                                                  (4, datetime(2012, 1, 4), 1, 1, 5, 'acme', 'Acme')])
+        self.assertEqual(list(updated.job_ids()), [4, 3, 1])
+        self.assertEqual(list(updated.job_ids(category_id=2)), [3, 1])
+        self.assertEqual(list(updated.job_ids(company_slug='acme', city_id=5)), [4])
+        self.assertEqual(list(updated.job_ids(jobtype_id=2)), [])
+        # the former snapshot is left as it was
+        self.assertEqual(list(snapshot.job_ids(category_id=1)), [2, 1])
+
+
+class JobRowCacheTestCase(unittest.TestCase):
+
+    def testVersionedRow(self):
+        from django.template import Template, Context
+        from listings.cache import bump_version
+
+        class FakeJob(object):
+            pk = 987654
+            title = u'Python developer'
+
+        job = FakeJob()
+        row = Template("{% load listings_tags %}{% cache_job_row 'test' job %}{{ job.title }}{% end_cache_job_row %}")
+        self.assertEqual(row.render(Context({'job': job})), u'Python developer')
+        job.title = u'Django developer'
+        self.assertEqual(row.render(Context({'job': job})), u'Python developer')
+        # saving the job bumps its version
+        bump_version('job:%d' % job.pk)
+        self.assertEqual(row.render(Context({'job': job})), u'Django developer')
+
+
+class JobFixtureTestCase(unittest.TestCase):
+    ''' Creates a category and a job type, and deletes them along with the
+        jobs made by create_job.
+    '''
+    category_name = None
+    job_type_name = None
+
+    def setUp(self):
+        self.category = Category.objects.create(name=self.category_name)
+        self.job_type = Type.objects.create(name=self.job_type_name)
+        self.jobs = []
+
+    def tearDown(self):
+        for job in self.jobs:
+            job.delete()
+        self.category.delete()
+        self.job_type.delete()
+
+    def create_job(self, **kwargs):
+        values = {'category': self.category, 'jobtype': self.job_type,
+                  'company': 'Tyrell Corporation', 'outside_location': 'Los Angeles',
+                  'poster_email': 'hr@tyrellcorp.com'}
+        values.update(kwargs)
+        job = Job.objects.create(**values)
+        self.jobs.append(job)
+        return job
+
+
+class TopJobsTestCase(JobFixtureTestCase):
+    category_name = 'Replicant Hunting'
+    job_type_name = 'Contract'
+
+    def setUp(self):
+        from datetime import datetime, timedelta
+        from listings.models import POSTING_ACTIVE, POSTING_INACTIVE
+        super(TopJobsTestCase, self).setUp()
+        # newer than any other job, so they top the lists
+        tomorrow = datetime.now() + timedelta(days=1)
+        self.active_job = self.create_job(title='Blade runner', description='Retire replicants.',
+                company='LAPD', poster_email='bryant@lapd.gov',
+                status=POSTING_ACTIVE, created_on=tomorrow)
+        self.inactive_job = self.create_job(title='Blade runner', description='Retire more replicants.',
+                company='LAPD', poster_email='bryant@lapd.gov',
+                status=POSTING_INACTIVE, created_on=tomorrow + timedelta(hours=1))
+
+    def testLatestJobsAreActive(self):
+        from listings.templatetags.listings_tags import get_top_jobs
+        from listings.models import POSTING_ACTIVE
+        jobs = get_top_jobs('latest', Job.active.all(), 10)
+        self.assertEqual(jobs[0], self.active_job)
+        self.assertFalse(self.inactive_job in jobs)
+        self.assertTrue(all(job.status == POSTING_ACTIVE for job in jobs))
+        self.assertEqual(jobs, sorted(jobs, key=lambda job: job.created_on, reverse=True))
+
+    def testVersionedIds(self):
+        from listings.templatetags.listings_tags import get_top_jobs
+        from listings.models import POSTING_ACTIVE
+        from listings.cache import bump_version
+        self.assertEqual(get_top_jobs('latest', Job.active.all(), 1), [self.active_job])
+        # update() sends no signal, the cached ids are kept
+        Job.objects.filter(pk=self.inactive_job.pk).update(status=POSTING_ACTIVE)
+        self.assertEqual(get_top_jobs('latest', Job.active.all(), 1), [self.active_job])
+        bump_version('top_jobs')
+        self.assertEqual(get_top_jobs('latest', Job.active.all(), 1), [self.inactive_job])
+
+
+class SearchIndexTestCase(JobFixtureTestCase):
+    category_name = 'Off-world Colonies'
+    job_type_name = 'Seasonal'
+
+    def setUp(self):
+        from listings.models import POSTING_ACTIVE
+        from listings.search import create_search_index, index_jobs
+        self.backend = settings.LISTINGS_SEARCH_BACKEND
+        settings.LISTINGS_SEARCH_BACKEND = 'database'
+        create_search_index()
+        index_jobs()
+        super(SearchIndexTestCase, self).setUp()
+        self.job = self.create_job(title='Replicant designer',
+                description='Design Nexus models for the colonies.', status=POSTING_ACTIVE)
+
+    def tearDown(self):
+        super(SearchIndexTestCase, self).tearDown()
+        settings.LISTINGS_SEARCH_BACKEND = self.backend
+
+    def search(self, keywords):
+        from listings.search import search_job_ids
+        return search_job_ids(Job.active.all(), keywords, 10)
+
+    def testSync(self):
+        self.assertTrue(self.job.pk in self.search(u'replicant colonies'))
+        self.assertFalse(self.job.pk in self.search(u'replicant accountant'))
+        self.job.title = u'Android designer'
+        self.job.save()
+        self.assertTrue(self.job.pk in self.search(u'android'))
+        self.assertFalse(self.job.pk in self.search(u'replicant'))
+        self.job.deactivate()
+        self.assertFalse(self.job.pk in self.search(u'android'))
+        self.job.activate()
+        self.assertTrue(self.job.pk in self.search(u'android'))
+
+    def testFTS5Query(self):
+        from listings.search import fts5_query
+        self.assertEqual(fts5_query(u'python  "web developer"'), u'"python" "web developer"')
+        # the query syntax of the keywords is not interpreted
+        self.assertEqual(fts5_query(u'c++ OR a"b'), u'"c++" "OR" "a""b"')
+        self.assertEqual(fts5_query(u'   '), u'')
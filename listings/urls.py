@@ -1,13 +1,10 @@
 # -*- coding: utf-8 -*-
 
 from django.conf.urls.defaults import *
-from listings.models import Job
 from listings.conf import settings as listings_settings
 from listings.feeds import LatestJobsFeed
 from listings.views import IndexAdView, AdPostView, AdDetailView
 
-from cities_light.models import City
-
 if listings_settings.LISTINGS_CAPTCHA_POST == 'simple':
     from listings.forms import CaptchaJobForm
     form_class = CaptchaJobForm
@@ -21,13 +18,6 @@ urlpatterns = patterns('django.views.generic',
                        url(r'^$', IndexAdView.as_view(),  # Index view
                        name='listings_job_list'),
 
-                       url(r'^' + listings_settings.LISTINGS_CITIES_URL + '/$',  # Cities view
-                       'list_detail.object_list',
-                       {'queryset': City.objects.all(),
-                       'extra_context': {'page_type': 'cities',
-                       'other_cities_total': Job.active.filter(city=None).count}},
-                       name='listings_cities_list'),
-
                        url(r'^' + listings_settings.LISTINGS_POST_URL + '/$',  # Post new job
                        AdPostView.as_view(),
                        name='listings_job_post'),
@@ -42,6 +32,10 @@ urlpatterns = patterns('django.views.generic',
 
 urlpatterns += patterns('',
 
+                        url(r'^' + listings_settings.LISTINGS_CITIES_URL + '/$',  # Cities view
+                        'listings.views.cities',
+                        name='listings_cities_list'),
+
                         url(r'^' + listings_settings.LISTINGS_VERIFY_URL +  # verify job
                         '/(?P<job_id>\d+)/(?P<auth>[-\w]+)/$',
                         'listings.views.job_verify',
@@ -80,6 +74,17 @@ urlpatterns += patterns('',
                         'listings.views.jobs_in_other_cities',
                         name='listings_jobs_in_other_cities'),
 
+                        url(r'^' + listings_settings.LISTINGS_JOBS_IN_URL +  # Jobs near city view
+                        '/(?P<city_name>[-\w]+)/within/(?P<radius>\d+)km/$',
+                        'listings.views.jobs_near_city',
+                        name='listings_jobs_near_city'),
+
+                        url(r'^' + listings_settings.LISTINGS_JOBS_IN_URL +  # Jobs near city view, newest first
+                        '/(?P<city_name>[-\w]+)/within/(?P<radius>\d+)km/by-date/$',
+                        'listings.views.jobs_near_city',
+                        {'order': 'date'},
+                        name='listings_jobs_near_city_by_date'),
+
                         url(r'^' + listings_settings.LISTINGS_JOBS_IN_URL +  # Jobs in city+jobtype view
                         '/(?P<city_name>[-\w]+)/(?P<tslug>[-\w]+)/$',
                         'listings.views.jobs_in_city',
@@ -104,6 +109,11 @@ urlpatterns += patterns('',
                         'listings.views.job_edit',
                         name='listings_ad_edit'),
 
+                        url(r'^' + listings_settings.LISTINGS_ACTIVATE_URL +  # Activate several jobs
+                        '/batch/$',
+                        'listings.views.job_activate_batch',
+                        name='listings_ad_activate_batch'),
+
                         url(r'^' + listings_settings.LISTINGS_ACTIVATE_URL +  # Activate job
                         '/(?P<job_id>\d+)/(?P<auth>[-\w]+)/$',
                         'listings.views.job_activate',
@@ -118,6 +128,28 @@ urlpatterns += patterns('',
                         'listings.views.job_search',
                         name='listings_job_search'),
 
+                        url(r'^api/jobs/$',  # JSON API
+                        'listings.api.job_list',
+                        name='listings_api_job_list'),
+
+                        url(r'^sitemap\.xml$',  # Sitemap index
+                        'listings.views.sitemap_index',
+                        name='listings_sitemap_index'),
+
+                        url(r'^sitemap\.xml\.gz$',  # Gzipped sitemap index
+                        'listings.views.sitemap_index',
+                        {'gzipped': True},
+                        name='listings_sitemap_index_gz'),
+
+                        url(r'^sitemap-(?P<section>[a-z]+)-(?P<page>\d+)\.xml$',  # Sitemap
+                        'listings.views.sitemap',
+                        name='listings_sitemap'),
+
+                        url(r'^sitemap-(?P<section>[a-z]+)-(?P<page>\d+)\.xml\.gz$',  # Gzipped sitemap
+                        'listings.views.sitemap',
+                        {'gzipped': True},
+                        name='listings_sitemap_gz'),
+
                         url(r'^rss/(?P<slug>[-\w]+)/$',  # RSS Feed
                         LatestJobsFeed(),
                         name='listings_feed'),
@@ -1,6 +1,6 @@
 # -*- coding: utf-8 -*-
 
-from django.shortcuts import get_object_or_404, redirect, render_to_response
+from django.shortcuts import get_object_or_404, redirect, render, render_to_response
 
 #  Deprecated generic views
 from django.views.generic.list_detail import object_detail, object_list
@@ -16,14 +16,23 @@ from django.core.urlresolvers import reverse
 from django.contrib import messages
 from django.utils.translation import ugettext_lazy as _
 from django.template import RequestContext
+from django.db import connection
 from django.db.models import Count
-from django.http import Http404, HttpResponseRedirect
+from django.http import Http404, HttpResponse, HttpResponseRedirect
 
-from listings.models import Job, Type, JobStat, JobSearch
+from listings.models import Job, Type, JobStat, JobSearch, AdminNotification, ArchivedJob, \
+                           get_job_counts
 from listings.models.base_models import POSTING_TEMPORARY, POSTING_ACTIVE
-from listings.postman import *
-from listings.helpers import *
+from listings.postman import MailPublishToAdmin, MailPublishPendingToUser, \
+                             MailPublishToUser, MailApplyOnline, JobMailContext
+from listings.helpers import getIP, minutes_between, get_query
 from listings.forms import ApplicationForm
+from listings.facets import get_facet_counts, count_facets
+from listings.snapshot import get_snapshot, SnapshotJobList
+from listings.routers import use_primary
+from listings.geo import cities_within
+from listings import sitemaps
+from listings import search as search_index
 from listings.conf import settings as listings_settings
 if listings_settings.LISTINGS_CAPTCHA_POST == 'simple':
     from listings.forms import CaptchaJobForm
@@ -36,12 +45,28 @@ from categories.models import Category
 from cities_light.models import City
 
 
+def archived_job(request, job_id, ad_url):
+    ''' Shows the job unavailable page for a job that was moved to the
+        archive, without touching the job table.
+    '''
+    job = get_object_or_404(ArchivedJob, pk=job_id, ad_url=ad_url)
+    return render(request, 'listings/unavailable.html', {'archived_job': job}, status=410)
+
+
 class IndexAdView(ListView):
-    queryset = Job.active.order_by('-created_on').select_related()
+    queryset = Job.active.order_by('-created_on', '-pk').select_related()
     template_name = 'listings/index.html'
     context_object_name = 'ad_list'
     paginate_by = listings_settings.LISTINGS_JOBS_PER_PAGE
 
+    def get_queryset(self):
+        snapshot = get_snapshot()
+        if snapshot is not None:
+            return SnapshotJobList(snapshot.ids)
+        if listings_settings.LISTINGS_SITE_INDEX:
+            return SnapshotJobList(Job.active.listed_ids())
+        return super(IndexAdView, self).get_queryset()
+
 
 class AdPostView(FormView):
     template_name = 'listings/ad_form.html'
@@ -56,6 +81,12 @@ class AdDetailView(DetailView):
     model = Job
     context_object_name = 'ad'
 
+    def get(self, request, *args, **kwargs):
+        try:
+            return super(AdDetailView, self).get(request, *args, **kwargs)
+        except Http404:
+            return archived_job(request, self.kwargs.get('pk'), self.kwargs.get('ad_url'))
+
     def get_context_data(self, **kwargs):
         context = super(AdDetailView, self).get_context_data(**kwargs)
         context['application_form'] = self.request.session.pop('application_form', ApplicationForm())
@@ -151,9 +182,12 @@ def job_detail(request, job_id, ad_url):
 
     # Instead of throwing a 404 error redirect to job unavailable page
     except Job.DoesNotExist:
+        if ArchivedJob.objects.filter(pk=job_id, ad_url=ad_url).exists():
+            return archived_job(request, job_id, ad_url)
         return redirect('listings_job_unavailable', permanent=True)
 
 
+@use_primary
 def job_verify(request, job_id, auth):
     ''' A view to display a newly created job.
     '''
@@ -164,35 +198,93 @@ def job_verify(request, job_id, auth):
     return object_detail(request, queryset=queryset, object_id=job_id, extra_context=extra_context, template_object_name='ad', template_name='listings/job_verify.html')
 
 
+def _active_job_list(request, filters, extra_context=None, facets=False, **kwargs):
+    ''' Lists the active jobs matching the filters, a dict of
+        category_id, jobtype_id, city_id or company_slug values, from the
+        snapshot of the active jobs when LISTINGS_SNAPSHOT is on, or from
+        the SiteListing table when LISTINGS_SITE_INDEX is on and the filters
+        are all columns of it.
+    '''
+    extra_context = extra_context or {}
+    snapshot = get_snapshot()
+    if snapshot is not None:
+        job_ids = snapshot.job_ids(**filters)
+        queryset = SnapshotJobList(job_ids)
+        if facets:
+            extra_context['facets'] = count_facets(snapshot.facet_rows(job_ids))
+    else:
+        # newest first, the order of the snapshot
+        queryset = Job.active.filter(**filters).order_by('-created_on', '-pk')
+        if facets:
+            extra_context['facets'] = get_facet_counts(queryset)
+        if listings_settings.LISTINGS_SITE_INDEX and 'company_slug' not in filters:
+            # only the jobs of the page shown are read from the job table
+            queryset = SnapshotJobList(Job.active.listed_ids(**filters))
+    return object_list(request, queryset=queryset, extra_context=extra_context, **kwargs)
+
+
 def jobs_category(request, cslug=None, tslug=None):
     ''' Displays a job list by category and/or job type but
         those two are optional.
     '''
     extra_context = {}
-    queryset = Job.active.all()
+    filters = {}
     if cslug:
         category = get_object_or_404(Category, slug=cslug)
-        queryset = queryset.filter(category=category)
+        filters['category_id'] = category.pk
         extra_context['selected_category'] = category
     if tslug:
         jobtype = get_object_or_404(Type, slug=tslug)
-        queryset = queryset.filter(jobtype=jobtype)
+        filters['jobtype_id'] = jobtype.pk
         extra_context['selected_jobtype'] = jobtype
-    return object_list(request, queryset=queryset,
-                    extra_context=extra_context,
-                    paginate_by=listings_settings.LISTINGS_JOBS_PER_PAGE)
+    return _active_job_list(request, filters, extra_context, facets=True,
+                            paginate_by=listings_settings.LISTINGS_JOBS_PER_PAGE)
 
 
 def jobs_in_city(request, city_name, tslug=None):
     ''' Display a job list by city and job type (optional).
     '''
     city = get_object_or_404(City, ascii_name=city_name)
-    queryset = Job.active.filter(city=city)
+    filters = {'city_id': city.pk}
     extra_context = {'city': city}
     if tslug:
         jobtype = get_object_or_404(Type, slug=tslug)
-        queryset = queryset.filter(jobtype=jobtype)
+        filters['jobtype_id'] = jobtype.pk
         extra_context['selected_jobtype'] = jobtype
+    return _active_job_list(request, filters, extra_context, facets=True,
+                            paginate_by=listings_settings.LISTINGS_JOBS_PER_PAGE)
+
+
+def jobs_near_city(request, city_name, radius, order=None):
+    ''' Displays the jobs in the cities at most `radius` km away from a
+        city, the nearest first or, when ordered by date, the newest first.
+    '''
+    city = get_object_or_404(City, ascii_name=city_name)
+    radius = min(int(radius), listings_settings.LISTINGS_GEO_MAX_RADIUS)
+    distances = cities_within(city, radius)
+    # the grid only holds cities with active jobs, but the city itself is
+    # always added
+    with_jobs = get_job_counts('city')
+    distances = dict((pk, d) for pk, d in distances.items() if pk in with_jobs)
+
+    if not distances:
+        # without cities there's no distance to select nor to order by
+        queryset = Job.active.none()
+    else:
+        column = '%s.%s' % (connection.ops.quote_name(Job._meta.db_table),
+                            connection.ops.quote_name('city_id'))
+        cases = ' '.join(['WHEN %s THEN %s'] * len(distances))
+        params = []
+        for pk, distance in distances.items():
+            params.extend((pk, round(distance, 1)))
+        queryset = Job.active.filter(city__in=distances.keys()) \
+                             .extra(select={'distance': 'CASE %s %s END' % (column, cases)},
+                                    select_params=params)
+        if order == 'date':
+            queryset = queryset.order_by('-created_on')
+        else:
+            queryset = queryset.order_by('distance', '-created_on')
+    extra_context = {'city': city, 'radius': radius, 'order': order or 'distance'}
     return object_list(request, queryset=queryset,
                     extra_context=extra_context,
                     paginate_by=listings_settings.LISTINGS_JOBS_PER_PAGE)
@@ -201,8 +293,21 @@ def jobs_in_city(request, city_name, tslug=None):
 def jobs_in_other_cities(request):
     ''' Displays a list with jobs in cities outside.
     '''
-    queryset = Job.active.filter(city=None)
-    return object_list(request, queryset=queryset)
+    return _active_job_list(request, {'city_id': None})
+
+
+def cities(request):
+    ''' Displays the cities that have active jobs along with their number
+        of jobs, and the number of jobs posted outside of them.
+    '''
+    counts = get_job_counts('city')
+    city_list = list(City.objects.filter(pk__in=[pk for pk in counts if pk]).order_by('name'))
+    for city in city_list:
+        city.total_jobs = counts[city.pk]
+    return render(request, 'listings/city_list.html',
+                  {'page_type': 'cities',
+                   'object_list': city_list,
+                   'other_cities_total': counts.get(0, 0)})
 
 
 def companies(request):
@@ -218,14 +323,16 @@ def companies(request):
 def jobs_at(request, company_slug, tslug=None):
     ''' Displays a job list by company, jobtype is optional.
     '''
-    queryset = Job.active.filter(company_slug=company_slug)
+    filters = {'company_slug': company_slug}
+    extra_context = {}
     if tslug:
         jobtype = get_object_or_404(Type, slug=tslug)
-        queryset = queryset.filter(jobtype=jobtype)
+        filters['jobtype_id'] = jobtype.pk
         extra_context['selected_jobtype'] = jobtype
-    return object_list(request, queryset=queryset)
+    return _active_job_list(request, filters, extra_context)
 
 
+@use_primary
 def job_confirm(request, job_id, auth):
     ''' A view to confirm a recently created job, if it has been published
         by a previously approved user then it gets automatically published,
@@ -237,12 +344,17 @@ def job_confirm(request, job_id, auth):
     new_post = job.is_temporary()
     requires_mod = not job.email_published_before() and \
                  listings_settings.LISTINGS_ENABLE_NEW_POST_MODERATION
+    # the user and admin mails share the same job urls and variables
+    mail_context = None
+    if listings_settings.LISTINGS_POSTER_NOTIFICATIONS or \
+       listings_settings.LISTINGS_ADMIN_NOTIFICATIONS:
+        mail_context = JobMailContext(job, request)
     if requires_mod:
         messages.add_message(request,
                        messages.INFO,
                        _('Your job post needs to be verified by a moderator.'))
         if listings_settings.LISTINGS_POSTER_NOTIFICATIONS:
-            pending_email = MailPublishPendingToUser(job, request)
+            pending_email = MailPublishPendingToUser(job, request, mail_context)
             pending_email.start()
     else:
         messages.add_message(request,
@@ -252,15 +364,20 @@ def job_confirm(request, job_id, auth):
             job.activate()
         if new_post:
             if listings_settings.LISTINGS_POSTER_NOTIFICATIONS:
-                publish_email = MailPublishToUser(job, request)
+                publish_email = MailPublishToUser(job, request, mail_context)
                 publish_email.start()
     queryset = Job.objects.all()
     if listings_settings.LISTINGS_ADMIN_NOTIFICATIONS:
-        admin_email = MailPublishToAdmin(job, request)
-        admin_email.start()
+        if listings_settings.LISTINGS_ADMIN_DIGEST_INTERVAL:
+            AdminNotification.objects.create(job=job, ip=getIP(request),
+                                             new_post=not job.is_active())
+        else:
+            admin_email = MailPublishToAdmin(job, request, mail_context)
+            admin_email.start()
     return object_detail(request, queryset=queryset, object_id=job_id, template_object_name='ad', template_name='listings/job_confirm.html')
 
 
+@use_primary
 def job_edit(request, job_id, auth):
     ''' A view for editing published or unpublished job posts.
     '''
@@ -272,6 +389,7 @@ def job_edit(request, job_id, auth):
            listings_settings.LISTINGS_VERIFY_URL + '/%(id)d/%(auth)s/')
 
 
+@use_primary
 def job_activate(request, job_id, auth):
     ''' Gets a job and activates it, only if it's not already activated,
         it also sends the notification mail to the poster.
@@ -292,6 +410,35 @@ def job_activate(request, job_id, auth):
                             object_id=job_id, extra_context=extra_context)
 
 
+@use_primary
+def job_activate_batch(request):
+    ''' Activates the jobs given as comma separated "id-admin_auth" pairs
+        in the jobs parameter, as linked from the admin notifications
+        digest, and sends the notification mail to each poster.
+    '''
+    auths = {}
+    for pair in request.GET.get('jobs', '').split(','):
+        try:
+            job_id, auth = pair.split('-', 1)
+            auths[int(job_id)] = auth
+        except ValueError:
+            continue
+    activated = 0
+    for job in Job.objects.filter(pk__in=auths.keys()):
+        if job.admin_auth != auths[job.pk] or job.is_active():
+            continue
+        job.activate()
+        if listings_settings.LISTINGS_POSTER_NOTIFICATIONS:
+            publish_email = MailPublishToUser(job, request)
+            publish_email.start()
+        activated += 1
+    messages.add_message(request,
+                         messages.INFO,
+                         _('%(count)d job(s) have been activated.') % {'count': activated})
+    return redirect('listings_job_list')
+
+
+@use_primary
 def job_deactivate(request, job_id, auth):
     ''' Deactivates a job and shows an active jobs list.
     '''
@@ -311,7 +458,8 @@ def job_deactivate(request, job_id, auth):
 
 def job_search(request):
     ''' A search view, does the job but not great. Job searches should be
-        handled by a proper search app, namely django-haystack.
+        handled by a proper search app, namely django-haystack, or by the
+        database full-text index with LISTINGS_SEARCH_BACKEND = 'database'.
     '''
     query_string = ''
     found_entries = Job.objects.none()
@@ -320,14 +468,44 @@ def job_search(request):
         request.session['keywords'] = request.POST['keywords']
         query_string = request.session['keywords']
         extra_context['keywords'] = query_string
-        search_fields = ['title', 'description', 'category',
-                             'jobtype', 'city', 'outside_location', 'company', ]
-        entry_query = get_query(query_string, search_fields)
         jobs_per_search = listings_settings.LISTINGS_JOBS_PER_SEARCH
-        found_entries = Job.objects.filter(entry_query)\
-                                     .order_by('-created_on')[:jobs_per_search]
+        if search_index.is_enabled():
+            ids = search_index.search_job_ids(Job.active.all(), query_string, jobs_per_search)
+            found_entries = SnapshotJobList(ids)
+            extra_context['facets'] = get_facet_counts(Job.objects.filter(pk__in=ids))
+        else:
+            search_fields = ['title', 'description', 'category',
+                                 'jobtype', 'city', 'outside_location', 'company', ]
+            entry_query = get_query(query_string, search_fields)
+            found_entries = Job.objects.filter(entry_query)\
+                                         .order_by('-created_on')[:jobs_per_search]
+            extra_context['facets'] = get_facet_counts(found_entries)
         search = JobSearch(keywords=query_string)
         search.save()
     return object_list(request, queryset=found_entries,
                     extra_context=extra_context,
                     paginate_by=listings_settings.LISTINGS_JOBS_PER_PAGE)
+
+
+def _sitemap_response(chunks, gzipped):
+    if gzipped:
+        return HttpResponse(sitemaps.gzip_stream(chunks), content_type='application/x-gzip')
+    return HttpResponse(chunks, content_type='application/xml')
+
+
+def sitemap_index(request, gzipped=False):
+    ''' Streams the index of the sitemaps.
+    '''
+    def location(section, page):
+        url = reverse('listings_sitemap', kwargs={'section': section, 'page': page})
+        return request.build_absolute_uri(url + (gzipped and '.gz' or ''))
+    return _sitemap_response(sitemaps.iter_sitemap_index(location), gzipped)
+
+
+def sitemap(request, section, page, gzipped=False):
+    ''' Streams a page of the sitemap of a section.
+    '''
+    page = int(page)
+    if section not in sitemaps.SECTIONS or not 1 <= page <= sitemaps.get_page_count(section):
+        raise Http404
+    return _sitemap_response(sitemaps.iter_sitemap(section, page), gzipped)